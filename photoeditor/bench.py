@@ -0,0 +1,283 @@
+import sys
+import time
+import resource
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from cvtools import order_points
+
+"""
+Helpers
+"""
+
+
+def peakrss():
+    """
+    PEAK RESIDENT SET SIZE OF THIS PROCESS IN MB
+    - ru_maxrss is reported in KB on Linux and in bytes on macOS
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def timeit(func, repeat):
+    """
+    BEST WALL TIME OF "repeat" CALLS, IN SECONDS
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def isolated(func, *args):
+    """
+    RUN A BENCHMARK IN A FRESH PROCESS SO ITS PEAK RSS IS NOT SHARED
+    """
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, *args).result()
+
+
+"""
+Rectification: two-step warp vs fused rectify()
+"""
+
+
+def _rectify_case(variant, path, repeat):
+    from pyimgscan import scansource, rectify, OutputBuffer
+    from cvtools import perspective_transform, brightness_contrast
+
+    corners, scale, _ = scansource(path)
+    if corners is None:
+        raise SystemExit(f"No document found in {path}")
+
+    img = cv2.imread(path)
+    buffer = OutputBuffer()
+    if variant == "two-step":
+        def run():
+            return perspective_transform(brightness_contrast(img, 1.56, -60), corners)
+    else:
+        def run():
+            return rectify(img, corners, buffer)
+
+    # the peak after the first run, minus the peak with just the decoded
+    # input, is the extra memory the rectification step needs
+    base = peakrss()
+    run()
+    extra = peakrss() - base
+    return timeit(run, repeat), extra
+
+
+def bench_rectify(args):
+    print(f"{'variant':<10}{'best (ms)':>12}{'extra peak RSS (MB)':>22}")
+    for variant in ("two-step", "fused"):
+        best, extra = isolated(_rectify_case, variant, args.image, args.repeat)
+        print(f"{variant:<10}{best * 1000:>12.1f}{extra:>22.1f}")
+
+
+"""
+Corner finding: gethull() + getcorners() vs getcandidates()
+"""
+
+
+def clutteredphoto(seed, fragments, size=(3000, 2250)):
+    """
+    SYNTHETIC PHONE PHOTO OF A DOCUMENT ON A BUSY BACKGROUND
+    - a bright quadrilateral sheet with text on a gravel-like background of
+      "fragments" small black and white blobs, each of which survives the
+      blur as a separate edge fragment in the 500px edge image
+    """
+
+    rng = np.random.default_rng(seed)
+    h, w = size
+    img = rng.integers(60, 120, (h, w, 3), dtype=np.uint8)
+
+    xs = rng.integers(0, w, fragments)
+    ys = rng.integers(0, h, fragments)
+    radii = rng.integers(6, 14, fragments)
+    shades = rng.integers(0, 2, fragments) * 255
+    for x, y, radius, shade in zip(xs, ys, radii, shades):
+        cv2.circle(img, (int(x), int(y)), int(radius), (int(shade),) * 3, -1)
+
+    jitter = rng.integers(-120, 120, (4, 2))
+    sheet = np.array(
+        [[0.15 * w, 0.12 * h], [0.85 * w, 0.1 * h], [0.88 * w, 0.9 * h], [0.12 * w, 0.88 * h]]
+    ) + jitter
+    # a soft shadow keeps the background blobs from touching the sheet edge
+    cv2.polylines(img, [sheet.astype(np.int32)], True, (70, 70, 70), 80)
+    cv2.fillConvexPoly(img, sheet.astype(np.int32), (225, 228, 230))
+    for line in range(12):
+        y = int(0.25 * h + line * 0.045 * h)
+        cv2.putText(img, "lorem ipsum dolor sit amet", (int(0.25 * w), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2.5, (30, 30, 30), 5)
+
+    return img, sheet
+
+
+def bench_corners(args):
+    from pyimgscan import preprocess
+    from detectors import gethull, getcorners, getcandidates
+
+    rows = []
+    for seed in range(args.images):
+        img, sheet = clutteredphoto(seed, args.fragments)
+        img_adj, scale, img_edge = preprocess(img)
+
+        def legacy():
+            return getcorners(gethull(img_edge))
+
+        def engine():
+            return getcandidates(img_edge)
+
+        found = []
+        for func in (legacy, engine):
+            corners = func()
+            if corners is None:
+                found.append(None)
+            else:
+                # distance of the worst corner from the true sheet corner, in px
+                corners = order_points(corners.reshape(4, 2)) * scale
+                found.append(np.abs(corners - order_points(sheet)).max())
+        rows.append((timeit(legacy, args.repeat), timeit(engine, args.repeat), *found))
+
+    print(f"{'image':<7}{'legacy (ms)':>13}{'engine (ms)':>13}{'legacy err':>12}{'engine err':>12}")
+    for seed, (t_legacy, t_engine, e_legacy, e_engine) in enumerate(rows):
+        fmt = lambda e: "miss" if e is None else f"{e:.0f}px"
+        print(f"{seed:<7}{t_legacy * 1000:>13.2f}{t_engine * 1000:>13.2f}"
+              f"{fmt(e_legacy):>12}{fmt(e_engine):>12}")
+    legacy_total = sum(row[0] for row in rows)
+    engine_total = sum(row[1] for row in rows)
+    print(f"speedup: {legacy_total / engine_total:.1f}x over {len(rows)} images "
+          f"with {args.fragments} clutter blobs each")
+
+
+"""
+JPEG quality search: binary search() vs size-model find()
+"""
+
+
+def bench_quality(args):
+    from PIL import Image
+    from compression import RateCurve
+
+    print(f"{'image':<30}{'search probes':>15}{'find probes':>13}{'search (s)':>12}{'find (s)':>10}")
+    totals = [0, 0]
+    for path in args.images:
+        image = Image.open(path)
+        row = []
+        for method in ("search", "find"):
+            # one target at a time, as when compressing to a single budget
+            probes = 0
+            start = time.perf_counter()
+            for target_kb in args.targets:
+                rate_curve = RateCurve(image, workers=args.workers)
+                getattr(rate_curve, method)([target_kb * 1024])
+                probes += rate_curve.probes
+            row += [probes, time.perf_counter() - start]
+        totals[0] += row[0]
+        totals[1] += row[2]
+        print(f"{path[-30:]:<30}{row[0]:>15}{row[2]:>13}{row[1]:>12.2f}{row[3]:>10.2f}")
+    targets = len(args.images) * len(args.targets)
+    print(f"probes per target: {totals[0] / targets:.1f} -> {totals[1] / targets:.1f}")
+
+
+"""
+Quality metrics: skimage vs metrics.Reference
+"""
+
+# largest differences from skimage the metrics engine may show
+PSNR_TOLERANCE = 1e-6
+SSIM_TOLERANCE = 1e-6
+MSE_TOLERANCE = 1e-9
+
+
+def bench_metrics(args):
+    import io
+    from PIL import Image
+    from skimage.metrics import peak_signal_noise_ratio as psnr
+    from skimage.metrics import structural_similarity as ssim
+    from skimage.metrics import mean_squared_error as mse
+    from metrics import Reference
+
+    print(f"{'image':<30}{'skimage (s)':>12}{'engine (s)':>12}{'max dPSNR':>12}{'max dSSIM':>12}{'max dMSE':>12}")
+    failed = False
+    for path in args.images:
+        image = Image.open(path).convert("RGB")
+        original = np.asarray(image)
+        candidates = []
+        for quality in args.qualities:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality)
+            candidates.append(np.asarray(Image.open(buffer)))
+
+        start = time.perf_counter()
+        expected = [
+            (psnr(original, c), ssim(original, c, win_size=7, channel_axis=-1, data_range=255), mse(original, c))
+            for c in candidates
+        ]
+        t_skimage = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = Reference(original)
+        found = [reference.measure(c) for c in candidates]
+        t_engine = time.perf_counter() - start
+
+        d_psnr = max(abs(e[0] - f["psnr"]) for e, f in zip(expected, found))
+        d_ssim = max(abs(e[1] - f["ssim"]) for e, f in zip(expected, found))
+        # relative, since the MSE scales with the error
+        d_mse = max(abs(e[2] - f["mse"]) / max(e[2], 1e-12) for e, f in zip(expected, found))
+        ok = d_psnr <= PSNR_TOLERANCE and d_ssim <= SSIM_TOLERANCE and d_mse <= MSE_TOLERANCE
+        failed |= not ok
+        print(f"{path[-30:]:<30}{t_skimage:>12.2f}{t_engine:>12.2f}"
+              f"{d_psnr:>12.1e}{d_ssim:>12.1e}{d_mse:>12.1e}{'' if ok else '  OUT OF TOLERANCE'}")
+
+    print(f"tolerance: PSNR {PSNR_TOLERANCE:.0e} dB, SSIM {SSIM_TOLERANCE:.0e}, MSE {MSE_TOLERANCE:.0e} (relative)")
+    if failed:
+        sys.exit(1)
+
+
+"""
+Main Proccess of the Program
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmarks for the scanner.")
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    sp = sub.add_parser("rectify", help="Two-step warp + contrast vs fused rectify().")
+    sp.add_argument("image", help="Photo of a document.")
+    sp.add_argument("-r", "--repeat", type=int, default=5)
+    sp.set_defaults(func=bench_rectify)
+
+    sp = sub.add_parser("corners", help="gethull() + getcorners() vs getcandidates().")
+    sp.add_argument("-n", "--images", type=int, default=10)
+    sp.add_argument("-f", "--fragments", type=int, default=20000)
+    sp.add_argument("-r", "--repeat", type=int, default=5)
+    sp.set_defaults(func=bench_corners)
+
+    sp = sub.add_parser("quality", help="Binary vs size-model JPEG quality search.")
+    sp.add_argument("images", nargs="+", help="Images to compress.")
+    sp.add_argument("-t", "--targets", type=int, nargs="+", default=[30, 100, 500, 1024], help="Targets in KB.")
+    sp.add_argument("-w", "--workers", type=int, default=None)
+    sp.set_defaults(func=bench_quality)
+
+    sp = sub.add_parser("metrics", help="skimage PSNR/SSIM/MSE vs metrics.Reference, with a tolerance check.")
+    sp.add_argument("images", nargs="+", help="Images to compress and compare.")
+    sp.add_argument("-q", "--qualities", type=int, nargs="+", default=[10, 30, 50, 70, 90])
+    sp.set_defaults(func=bench_metrics)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import queue
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# opacity of the black layer that darkens the whole video
+DARKEN = 0.50
+
+# opacity of the vignette at the window edge; it fades out over
+# VIGNETTE_BORDER times the shorter window side
+VIGNETTE = 0.60
+VIGNETTE_BORDER = 0.15
+
+# decoded frames the reader may keep ahead of the screen
+RING_FRAMES = 4
+
+# frame rate assumed when the video doesn't report a usable one
+DEFAULT_FPS = 30.0
+
+# window sizes whose shading is kept (a resize produces a few in a row)
+SHADE_SIZES = 4
+
+# fonts tried for the title, in order, before PIL's built-in one
+TITLE_FONTS = ("times.ttf", "arial.ttf", "C:/Windows/Fonts/times.ttf")
+
+
+def loadfont(size, names=TITLE_FONTS):
+    """
+    FIRST TRUETYPE FONT OF "names" THAT LOADS, OR PIL'S DEFAULT FONT
+    """
+
+    for name in names:
+        try:
+            return ImageFont.truetype(name, size)
+        except (OSError, ImportError):
+            continue
+    return ImageFont.load_default()
+
+
+class VideoReader:
+    """
+    DECODE A LOOPING VIDEO ON A BACKGROUND THREAD INTO A SMALL RING BUFFER
+    - frames are resized to "size" and converted to RGB on the thread, so the
+      UI only picks up finished frames;
+    - every frame returned advances the video by "step" frames; the frames in
+      between are only grabbed, not decoded, which keeps playback at its
+      real speed when the screen shows fewer frames;
+    - at most RING_FRAMES frames wait in the buffer; the reader sleeps while
+      it is full
+    """
+
+    def __init__(self, capture, size=None, frames=RING_FRAMES):
+        self.capture = capture
+        self.size = size
+        self.step = 1
+
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if 1 <= fps <= 240 else DEFAULT_FPS
+
+        self._frames = queue.Queue(maxsize=frames)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def alive(self):
+        return self._thread.is_alive() or not self._frames.empty()
+
+    def get(self):
+        """
+        NEXT DECODED FRAME (RGB ARRAY), OR None WHEN NONE IS READY YET
+        """
+
+        try:
+            return self._frames.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _read(self):
+        for _ in range(self.step - 1):
+            if not self.capture.grab():
+                break
+        ret, frame = self.capture.read()
+        if not ret:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = self._read()
+            if frame is None:
+                print("Failed to read video frame after loop")
+                return
+
+            size = self.size
+            if size is not None and (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            while not self._stop.is_set():
+                try:
+                    self._frames.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def stop(self):
+        """
+        STOP THE THREAD AND RELEASE THE VIDEO
+        """
+
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self.capture.release()
+
+
+class Compositor:
+    """
+    DARKENED, VIGNETTED VIDEO FRAMES WITH THE TITLE TEXT ON TOP
+    - the black layer and the vignette are folded into one multiplier per
+      window size, applied to a frame in a single vectorized pass;
+    - the title is rendered once per text (each typing step) into a small
+      layer that is pasted over its own box only;
+    - the font is loaded once
+    """
+
+    def __init__(self, font_size=42, darken=DARKEN, vignette=VIGNETTE, border=VIGNETTE_BORDER):
+        self.font = loadfont(font_size)
+        self.darken = darken
+        self.vignette = vignette
+        self.border = border
+        self._shades = OrderedDict()
+        self._texts = {}
+
+    def shade(self, size):
+        """
+        MULTIPLIER (x255) OF EVERY PIXEL AT WINDOW "size", AS A 3-CHANNEL IMAGE
+        """
+
+        shade = self._shades.get(size)
+        if shade is not None:
+            self._shades.move_to_end(size)
+            return shade
+
+        w, h = size
+        border = min(w, h) * self.border
+        y, x = np.ogrid[:h, :w]
+        dist = np.minimum(np.minimum(y, h - y), np.minimum(x, w - x))
+        vignette = self.vignette * np.clip(1 - dist / border, 0, 1)
+
+        multiplier = (1 - self.darken) * (1 - vignette)
+        shade = np.round(255 * multiplier).astype(np.uint8)
+        shade = np.ascontiguousarray(np.repeat(shade[..., None], 3, axis=2))
+
+        self._shades[size] = shade
+        while len(self._shades) > SHADE_SIZES:
+            self._shades.popitem(last=False)
+        return shade
+
+    def textlayer(self, text):
+        """
+        (LAYER, (WIDTH, HEIGHT)) OF "text" WITH ITS SHADOW; LAYER IS RGBA
+        """
+
+        cached = self._texts.get(text)
+        if cached is not None:
+            return cached
+
+        draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=self.font)
+        layer = Image.new("RGBA", (right + 2, bottom + 2), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        draw.text((2, 2), text, fill=(0, 0, 0, 200), font=self.font)
+        draw.text((0, 0), text, fill="white", font=self.font)
+
+        self._texts[text] = layer, (right - left, bottom - top)
+        return self._texts[text]
+
+    def compose(self, frame, text="", size=None):
+        """
+        FINAL RGB IMAGE OF A FRAME (RGB ARRAY) AT WINDOW "size"
+        - "frame" is overwritten when it already has that size
+        """
+
+        if size is not None and (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size)
+        h, w = frame.shape[:2]
+        cv2.multiply(frame, self.shade((w, h)), frame, scale=1 / 255)
+        image = Image.fromarray(frame)
+
+        if text:
+            layer, (text_w, text_h) = self.textlayer(text)
+            x = (w - text_w) // 2
+            y = int(h * 0.22) - text_h // 2
+            image.paste(layer, (x, y), layer)
+        return image
@@ -0,0 +1,495 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from inputs import collectinputs, mirrorpaths
+from metrics import Reference
+
+# JPEG quality range searched by the rate-distortion engine
+MIN_QUALITY = 1
+MAX_QUALITY = 100
+
+# pixel count of the downsampled copy that predicts the size curve; small
+# images get a copy of 1/16 of their size so it stays cheap to encode
+PROXY_PIXELS = 160 * 1024
+
+# qualities the proxy is encoded at; the levels between are interpolated
+PROXY_QUALITIES = (1, 5, 10, 20, 30, 40, 50, 60, 70, 75, 80, 85, 90, 93, 95, 97, 99, 100)
+
+# targets of "Run All & Plot" and the default targets of the command line
+DEFAULT_TARGETS_KB = (30, 100, 500, 1024)
+
+# columns of the CSV output, in order
+FIELDS = ("input", "target_kb", "actual_kb", "quality", "psnr", "ssim", "mse", "probes")
+
+
+class RateCurve:
+    """
+    SIZE-VS-QUALITY CURVE OF ONE IMAGE, ENCODED ON DEMAND
+    - every quality level is encoded at most once; sizes and encoded bytes are
+      memoized, so searches for several targets share their probes;
+    - missing levels are encoded in parallel on a thread pool (PIL releases
+      the GIL while encoding);
+    - "check" is called before every encode and may raise to abort a search
+    """
+
+    def __init__(self, image, workers=None, check=None):
+        # JPEG can't store alpha or palette images
+        if image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        image.load()
+        self.image = image
+        self.workers = workers or os.cpu_count() or 1
+        self.check = check or (lambda: None)
+        self.sizes = {}
+        self._data = {}
+        self._proxy = None
+        self._proxypixels = None
+
+    @property
+    def probes(self):
+        """
+        NUMBER OF FULL-SIZE ENCODES SO FAR
+        """
+
+        return len(self.sizes)
+
+    @staticmethod
+    def _encodeimage(image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    def _encodemany(self, image, qualities):
+        if len(qualities) == 1:
+            self.check()
+            return [self._encodeimage(image, qualities[0])]
+
+        # save() keeps the encoder settings on the image object, so every
+        # worker thread encodes from its own copy, made on its first encode
+        local = threading.local()
+
+        def encode(quality):
+            self.check()
+            if not hasattr(local, "image"):
+                local.image = image.copy()
+            return self._encodeimage(local.image, quality)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(qualities))) as pool:
+            return list(pool.map(encode, qualities))
+
+    def encode(self, qualities):
+        """
+        ENCODE THE QUALITY LEVELS THAT ARE NOT KNOWN YET, IN PARALLEL
+        """
+
+        missing = sorted(set(qualities) - set(self.sizes))
+        results = self._encodemany(self.image, missing) if missing else []
+
+        for quality, data in zip(missing, results):
+            self._data[quality] = data
+            self.sizes[quality] = len(data)
+        return [self.sizes[quality] for quality in qualities]
+
+    def data(self, quality):
+        """
+        ENCODED JPEG BYTES AT "quality"
+        """
+
+        self.encode([quality])
+        return self._data[quality]
+
+    def curve(self, qualities=None):
+        """
+        (QUALITY, SIZE IN BYTES) PAIRS, SORTED BY QUALITY
+        - without "qualities", only the levels probed so far are returned
+        """
+
+        if qualities is not None:
+            self.encode(qualities)
+        return sorted(self.sizes.items())
+
+    def _bracket(self, target_bytes):
+        # the lowest level known to be too large, and the highest level below
+        # it that is known to fit; the answer lies between the two
+        ceiling = min(
+            (q for q, size in self.sizes.items() if size > target_bytes),
+            default=MAX_QUALITY + 1,
+        )
+        best = max(
+            (q for q, size in self.sizes.items() if size <= target_bytes and q < ceiling),
+            default=MIN_QUALITY - 1,
+        )
+        return best, ceiling
+
+    def search(self, targets_bytes):
+        """
+        HIGHEST QUALITY WHOSE ENCODED SIZE FITS EACH TARGET
+        - all targets are searched in lockstep: every round splits each open
+          bracket into several parts and encodes the union of all split
+          points at once, so the thread pool stays busy and targets whose
+          brackets overlap share probes;
+        - size is assumed to grow with quality, as the binary search did;
+        - targets nothing fits into get the lowest quality;
+        - returns {target_bytes: quality}
+        """
+
+        while True:
+            brackets = {target: self._bracket(target) for target in targets_bytes}
+            open_brackets = [
+                (best, ceiling) for best, ceiling in set(brackets.values())
+                if ceiling - best > 1
+            ]
+            if not open_brackets:
+                break
+
+            # share the workers between the open brackets (at least one probe
+            # each, which makes the search a plain binary search on one core)
+            per_bracket = max(1, self.workers // len(open_brackets))
+            probes = set()
+            for best, ceiling in open_brackets:
+                step = (ceiling - best) / (per_bracket + 1)
+                for i in range(1, per_bracket + 1):
+                    probes.add(min(ceiling - 1, max(best + 1, round(best + i * step))))
+            self.encode(probes)
+
+        return {
+            target: max(best, MIN_QUALITY)
+            for target, (best, ceiling) in brackets.items()
+        }
+
+    def proxycurve(self):
+        """
+        ENCODED SIZES OF A DOWNSAMPLED COPY AT EVERY QUALITY LEVEL
+        - the copy is encoded at PROXY_QUALITIES only and the log sizes are
+          interpolated in between; returns an array indexed by quality
+        """
+
+        if self._proxy is None:
+            w, h = self.image.size
+            factor = min(0.25, (PROXY_PIXELS / float(w * h)) ** 0.5)
+            size = (max(8, round(w * factor)), max(8, round(h * factor)))
+            proxy = self.image.resize(size, Image.BOX)
+            self._proxypixels = size[0] * size[1]
+            sizes = self._encodemany(proxy, list(PROXY_QUALITIES))
+            log_sizes = np.log([len(data) for data in sizes])
+            qualities = np.arange(MAX_QUALITY + 1)
+            self._proxy = np.exp(np.interp(qualities, PROXY_QUALITIES, log_sizes))
+        return self._proxy
+
+    def predict(self):
+        """
+        PREDICTED FULL-SIZE ENCODED SIZE AT EVERY QUALITY LEVEL
+        - the proxy curve scaled by the full/proxy size ratio measured at the
+          full-size probes so far (interpolated between probes), or by the
+          pixel count ratio before the first probe; returns an array indexed
+          by quality that never decreases
+        """
+
+        proxy = self.proxycurve()
+        qualities = np.arange(MAX_QUALITY + 1)
+        if self.sizes:
+            probed = sorted(self.sizes)
+            ratios = [self.sizes[q] / proxy[q] for q in probed]
+            predicted = proxy * np.exp(np.interp(qualities, probed, np.log(ratios)))
+        else:
+            w, h = self.image.size
+            predicted = proxy * (w * h / float(self._proxypixels))
+        return np.maximum.accumulate(predicted)
+
+    def find(self, targets_bytes):
+        """
+        HIGHEST QUALITY WHOSE ENCODED SIZE FITS EACH TARGET, WITH FEW PROBES
+        - same result as search(), but the probes are placed by predict();
+        - the full/proxy size ratio barely changes with quality, so the first
+          round is a single probe that calibrates the prediction for all
+          targets;
+        - the next round encodes the predicted quality and the level above
+          it, which settles a target in one round (2-3 probes in all) when the
+          prediction is right, and recalibrates the prediction for the other
+          targets;
+        - a target the prediction missed is no longer guessed: its bracket is
+          bisected until both ends are measured, then the quality is
+          interpolated between their log sizes; when that doesn't halve the
+          bracket within two rounds, the next round bisects again, so the
+          bracket at least halves every two rounds;
+        - returns {target_bytes: quality}, see "probes" for the encode count
+        """
+
+        if not self.sizes and targets_bytes:
+            predicted = self.predict()
+            target = sorted(targets_bytes)[len(targets_bytes) // 2]
+            fits = np.flatnonzero(predicted[MIN_QUALITY:] <= target)
+            self.encode([MIN_QUALITY + int(fits[-1]) if len(fits) else MIN_QUALITY])
+
+        # target -> widths of its bracket in the rounds so far
+        widths = {}
+        while True:
+            brackets = {target: self._bracket(target) for target in targets_bytes}
+            open_targets = [
+                target for target, (best, ceiling) in brackets.items()
+                if ceiling - best > 1
+            ]
+            if not open_targets:
+                break
+
+            predicted = self.predict()
+            probes = set()
+            for target in open_targets:
+                best, ceiling = brackets[target]
+                seen = widths.setdefault(target, [])
+                seen.append(ceiling - best)
+                halving = len(seen) < 3 or 2 * seen[-1] <= seen[-3]
+                if len(seen) == 1:
+                    fits = np.flatnonzero(predicted[MIN_QUALITY:] <= target)
+                    guess = MIN_QUALITY + int(fits[-1]) if len(fits) else MIN_QUALITY - 1
+                    guess = min(ceiling - 1, max(best + 1, guess))
+                    probes.add(guess)
+                    # when nothing is predicted to fit, the lowest level alone
+                    # settles the target if the prediction is right
+                    if guess + 1 < ceiling and len(fits):
+                        probes.add(guess + 1)
+                elif best < MIN_QUALITY or ceiling > MAX_QUALITY or not halving:
+                    probes.add((best + ceiling) // 2)
+                else:
+                    # log size is close to linear in quality over a bracket
+                    low, high = np.log(self.sizes[best]), np.log(self.sizes[ceiling])
+                    level = best + int((np.log(target) - low) / (high - low) * (ceiling - best))
+                    probes.add(min(ceiling - 1, max(best + 1, level)))
+            self.encode(probes)
+
+        return {
+            target: max(best, MIN_QUALITY)
+            for target, (best, ceiling) in brackets.items()
+        }
+
+
+"""
+Analysis
+"""
+
+
+def measure(reference, data):
+    """
+    PSNR, SSIM AND MSE OF AN ENCODED JPEG AGAINST THE ORIGINAL
+    - "reference" is a metrics.Reference of the RGB original, "data" the
+      encoded bytes;
+    - returns (metrics dict, decoded PIL image)
+    """
+
+    compressed_image = Image.open(io.BytesIO(data))
+    compressed = np.array(compressed_image.convert("RGB"))
+    return reference.measure(compressed), compressed_image
+
+
+def analyze(image, targets_kb=DEFAULT_TARGETS_KB, workers=None, progress=None, check=None):
+    """
+    COMPRESS AN IMAGE TO EACH TARGET SIZE AND MEASURE THE QUALITY LOSS
+    - returns (results, rate_curve): one dict per target with target_kb,
+      actual_kb, quality, psnr, ssim and mse, in the order of "targets_kb",
+      and the RateCurve holding the encoded bytes and the probed curve;
+    - "progress" is called with the finished fraction (0.0 - 1.0) between
+      steps, and "check" before every encode; both may raise to abort the
+      analysis
+    """
+
+    if progress is None:
+        progress = lambda fraction: None
+
+    progress(0.0)
+    rate_curve = RateCurve(image, workers, check)
+    # the original's SSIM moments are computed once for all targets
+    reference = Reference(np.array(rate_curve.image.convert("RGB")), workers=workers)
+
+    # all targets are searched together so they share encodes
+    qualities = rate_curve.find([target_kb * 1024 for target_kb in targets_kb])
+    progress(0.5)
+
+    results = []
+    for index, target_kb in enumerate(targets_kb):
+        quality = qualities[target_kb * 1024]
+        data = rate_curve.data(quality)
+        metrics, _ = measure(reference, data)
+        results.append({
+            "target_kb": target_kb,
+            "actual_kb": len(data) / 1024,
+            "quality": quality,
+            **metrics,
+        })
+        progress(0.5 + 0.5 * (index + 1) / len(targets_kb))
+    return results, rate_curve
+
+
+def plotcurve(results, curve=None):
+    """
+    RENDER THE RATE-DISTORTION PLOT TO PNG BYTES
+    - draws on a bare Agg figure, so it works without a display and from
+      any thread (pyplot keeps global state and needs the GUI's backend);
+    - "curve" adds every probed (quality, size) point on a second axis
+    """
+
+    # imported here so the analysis itself doesn't need matplotlib
+    import matplotlib.style
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    results = sorted(results, key=lambda r: r['actual_kb'])
+    sizes = [r['actual_kb'] for r in results]
+    psnr_vals = [r['psnr'] for r in results]
+
+    with matplotlib.style.context('dark_background'):
+        fig = Figure(figsize=(8, 4))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+
+        ax.plot(sizes, psnr_vals, 'w-o', label='PSNR')
+        ax.set_xlabel("File Size (KB)")
+        ax.set_ylabel("PSNR (dB)")
+        ax.set_title("Rate-Distortion Curve")
+        ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+        ax.legend()
+
+        # every quality level the search encoded, on a second axis
+        if curve:
+            ax_quality = ax.twinx()
+            ax_quality.plot([size / 1024 for _, size in curve], [q for q, _ in curve], 'c.--', alpha=0.6)
+            ax_quality.set_ylabel("JPEG Quality", color='c')
+
+        # the "knee" where more bytes stop buying much quality
+        if len(sizes) > 2:
+            slopes = [(psnr_vals[i+1] - psnr_vals[i]) / max(sizes[i+1] - sizes[i], 1e-9) for i in range(len(sizes)-1)]
+            optimal_index = np.argmax(np.diff(slopes)) + 1 if len(slopes) > 1 else 0
+            ax.plot(sizes[optimal_index], psnr_vals[optimal_index], 'r*', markersize=15, label='Optimal Point')
+            ax.legend()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', bbox_inches='tight')
+    return buf.getvalue()
+
+
+"""
+Batch Processing
+"""
+
+
+def analyzefile(path, targets_kb, plot_path=None):
+    """
+    ANALYZE ONE IMAGE FILE; RUNS INSIDE A WORKER PROCESS
+    - returns (rows, error): one row per target (see FIELDS), or an error
+      message if the image could not be analyzed
+    """
+
+    try:
+        with Image.open(path) as image:
+            # the pool already uses all cores, so encode on one thread
+            results, rate_curve = analyze(image, targets_kb, workers=1)
+        if plot_path:
+            os.makedirs(os.path.dirname(plot_path) or ".", exist_ok=True)
+            with open(plot_path, "wb") as f:
+                f.write(plotcurve(results, rate_curve.curve()))
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+    rows = [dict(input=path, **r, probes=rate_curve.probes) for r in results]
+    return rows, None
+
+
+def runanalysis(inputs, targets_kb, out, fmt="csv", plot_dir=None, workers=None):
+    """
+    ANALYZE MANY IMAGES ACROSS A PROCESS POOL
+    - "inputs" are (path, relative path) pairs, see inputs.collectinputs;
+    - rows are written to "out" as they complete, as CSV or as one JSON
+      object per line; progress and errors go to stderr;
+    - plots are written to "plot_dir", mirroring the input tree;
+    - returns the number of images that could not be analyzed
+    """
+
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+
+    total = len(inputs)
+    failed = 0
+    done = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        plots = mirrorpaths(inputs, plot_dir, ".png") if plot_dir else [(path, None) for path, _ in inputs]
+        for path, plot_path in plots:
+            futures[pool.submit(analyzefile, path, targets_kb, plot_path)] = path
+
+        for future in as_completed(futures):
+            path = futures[future]
+            rows, error = future.result()
+            done += 1
+            if error:
+                failed += 1
+                print(f"[{done}/{total}] error {path}: {error}", file=sys.stderr)
+                continue
+            for row in rows:
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(row) + "\n")
+            out.flush()
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"[{done}/{total}] ok {path} ({rate:.1f} img/s)", file=sys.stderr)
+
+    return failed
+
+
+"""
+Main Proccess of the Program
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Compress images to target sizes and report the quality loss.",
+        fromfile_prefix_chars="@",
+    )
+    ap.add_argument(
+        "inputs", nargs="+", metavar="INPUT",
+        help="Directories, glob patterns or image files to analyze.",
+    )
+    ap.add_argument(
+        "-t", "--targets", type=int, nargs="+", default=list(DEFAULT_TARGETS_KB), metavar="KB",
+        help="Target file sizes in KB (default: %(default)s).",
+    )
+    ap.add_argument(
+        "-f", "--format", choices=("csv", "json"), default="csv",
+        help="CSV, or one JSON object per line (default: csv).",
+    )
+    ap.add_argument("-o", "--output", help="Output file (default: stdout).")
+    ap.add_argument("-p", "--plots", metavar="DIR", help="Write a rate-distortion plot per image to DIR.")
+    ap.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(),
+        help="Number of worker processes (default: all cores).",
+    )
+    args = ap.parse_args()
+
+    inputs = collectinputs(args.inputs)
+    if not inputs:
+        print("No images found.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            failed = runanalysis(inputs, args.targets, out, args.format, args.plots, args.workers)
+    else:
+        failed = runanalysis(inputs, args.targets, sys.stdout, args.format, args.plots, args.workers)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from cvtools import order_points
+from cvtools import getoutlines
+from cvtools import simple_erode
+from cvtools import blank
+
+# result of running one corner detector
+# - "corners" is a 4x2 float array in the coordinates of the detection image,
+#   or None if the detector found nothing
+# - "confidence" is between 0 (not a document) and 1 (clean rectangular sheet)
+Detection = namedtuple("Detection", ["detector", "corners", "confidence", "seconds"])
+
+# detector name -> (cost, function); the cascade runs cheapest first
+DETECTORS = {}
+
+# confidence a detection needs before the cascade stops escalating
+CONFIDENCE_THRESHOLD = 0.6
+
+# confidence below which the best detection is not taken for a document
+# (the CLAHE detector's minimum area rectangle fits almost anything)
+MIN_CONFIDENCE = 0.2
+
+
+def register(name, cost):
+    """
+    ADD A CORNER DETECTOR TO THE REGISTRY
+    - detectors take the 500px BGR image and its Canny edge image and return
+      four corner points (any order) or None
+    """
+
+    def decorator(func):
+        DETECTORS[name] = (cost, func)
+        return func
+
+    return decorator
+
+
+"""
+Scoring
+"""
+
+
+def scorequads(quads, shape):
+    """
+    SCORE HOW PLAUSIBLE QUADRILATERALS ARE AS THE OUTLINE OF A SHEET OF PAPER
+    - "quads" is an (N, 4, 2) array of corners in polygon order; all of them
+      are scored at once and an array of N scores in [0, 1] is returned;
+    - a quad must be convex;
+    - it should cover a good part of the frame, but not the whole frame (which
+      usually means the image border was picked up);
+    - its corners should lie inside the frame, not on its border (a shape cut
+      off by the border is a background object or an incomplete sheet);
+    - its corner angles should be close to 90 degrees
+    """
+
+    quads = np.asarray(quads, dtype=np.float64).reshape(-1, 4, 2)
+    h, w = shape[:2]
+    x, y = quads[..., 0], quads[..., 1]
+
+    # incoming and outgoing edge at every corner
+    edge_in = quads - np.roll(quads, 1, axis=1)
+    edge_out = np.roll(quads, -1, axis=1) - quads
+
+    # convex: the turn at every corner has the same sign
+    turns = edge_in[..., 0] * edge_out[..., 1] - edge_in[..., 1] * edge_out[..., 0]
+    convex = np.all(turns > 0, axis=1) | np.all(turns < 0, axis=1)
+
+    # shoelace formula, as a fraction of the frame
+    area = 0.5 * np.abs(np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1))
+    area /= float(h * w)
+    coverage = np.clip(area / 0.2, 0, 1) * np.clip((1.0 - area) / 0.05, 0, 1)
+
+    on_border = (x < 2) | (x > w - 3) | (y < 2) | (y > h - 3)
+    inside = 1.0 - on_border.sum(axis=1) / 4.0
+
+    # cosine of the angle at every corner
+    lengths = np.linalg.norm(edge_in, axis=2) * np.linalg.norm(edge_out, axis=2)
+    cosines = np.abs(np.sum(edge_in * edge_out, axis=2)) / np.maximum(lengths, 1e-9)
+    squareness = 1.0 - cosines.mean(axis=1)
+
+    return np.where(convex & np.all(lengths > 0, axis=1), coverage * inside * squareness, 0.0)
+
+
+def confidence(corners, shape):
+    """
+    SCORE ONE SET OF FOUR CORNERS (ANY ORDER), SEE scorequads()
+    """
+
+    return float(scorequads(order_points(corners), shape)[0])
+
+
+def detect(name, img_scaled, img_edge):
+    """
+    RUN ONE REGISTERED DETECTOR, TIMING AND SCORING ITS RESULT
+    """
+
+    cost, func = DETECTORS[name]
+    start = time.perf_counter()
+    corners = func(img_scaled, img_edge)
+    seconds = time.perf_counter() - start
+
+    if corners is None:
+        return Detection(name, None, 0.0, seconds)
+    corners = np.asarray(corners, dtype=np.float32).reshape(4, 2)
+    return Detection(name, corners, confidence(corners, img_scaled.shape), seconds)
+
+
+def cascade(img_scaled, img_edge, threshold=CONFIDENCE_THRESHOLD, floor=MIN_CONFIDENCE, names=None):
+    """
+    RUN DETECTORS FROM CHEAPEST TO MOST EXPENSIVE UNTIL ONE IS CONFIDENT
+    - returns the first detection reaching "threshold", otherwise the most
+      confident one found; None if that is below "floor" (no document);
+    - "names" restricts the cascade to the given detectors
+    """
+
+    order = sorted(names or DETECTORS, key=lambda name: DETECTORS[name][0])
+
+    best = None
+    for name in order:
+        detection = detect(name, img_scaled, img_edge)
+        if detection.corners is None:
+            continue
+        if best is None or detection.confidence > best.confidence:
+            best = detection
+        if detection.confidence >= threshold:
+            break
+
+    if best is None or best.confidence < floor:
+        return None
+    return best
+
+
+"""
+Corner Finding
+"""
+
+
+def gethull(img_edge):
+    """
+    1st ROUND OF OUTLINE FINDING, + CONVEX HULL
+    """
+
+    # make a copy of the edge image because the following function manipulates
+    # the input
+    img_prehull = img_edge.copy()
+
+    # find outlines in the (newly copied) edge image
+    outlines = getoutlines(img_prehull)
+
+    # create a blank image for convex hull operation
+    img_hull = blank(img_prehull.shape, img_prehull.dtype, "0")
+
+    # draw convex hulls (fit polygon) for all outlines detected to 'img_contour'
+    for outline in range(len(outlines)):
+
+        hull = cv2.convexHull(outlines[outline])
+
+        # parameters: source image, outlines (contours),
+        #             contour index (-1 for all), color, thickness
+        cv2.drawContours(img_hull, [hull], 0, 255, 3)
+
+    # erode the hull image to make the outline closer to paper
+    img_hull = simple_erode(img_hull)
+
+    return img_hull
+
+
+def getcorners(img_hull):
+    """
+    2nd ROUND OF OUTLINE FINDING, + SORTING & APPROXIMATION
+    """
+
+    # make a copy of the edge image because the following function manipulates
+    # the input
+    img_outlines = img_hull.copy()
+
+    # find outlines in the convex hull image
+    outlines = getoutlines(img_outlines)
+
+    # sort the outlines by area from large to small, and only take the largest 4
+    # outlines in order to speed up the process and not waste time
+    outlines = sorted(outlines, key=cv2.contourArea, reverse=True)[:4]
+
+    corners = None
+    # loop over outlines
+    for outline in outlines:
+
+        # find the perimeter of each outline for use in approximation
+        perimeter = cv2.arcLength(outline, True)
+
+        # > approximate a rough contour for each outline found, with (hopefully)
+        #   4 points (rectangular sheet of paper); [Douglas-Peuker Algorithm]
+        # > FIRST OPTION is the input outline;
+        # > SECOND OPTION is the accuracy of approximation (epsilon), here it
+        #   is set to a percentage of the perimeter of the outline
+        # > THIRD OPTION is whether to assume an outline
+        #   is closed, which in this case is yes (sheet of paper)
+        approx = cv2.approxPolyDP(outline, 0.02 * perimeter, True)
+
+        # if the approximation has 4 points, then assume it is correct, and
+        # assign these points to the 'corners' variable
+        if len(approx) == 4:
+            corners = approx
+            break
+
+    return corners
+
+
+def getcandidates(img_edge, min_extent=0.05, keep=6):
+    """
+    CORNER-CANDIDATE ENGINE: FILTER, MERGE AND SCORE IN BATCHES
+    - the edge fragments are found with a single contour pass; their bounding
+      boxes are computed together in one NumPy batch, and fragments spanning
+      less than "min_extent" of the frame are dropped before any hull work;
+    - the remaining fragments are merged by one convex hull over all of their
+      points (which joins a page outline broken into separate sides), next to
+      the hulls of the largest fragments on their own;
+    - four-point approximations of those hulls at several accuracies are
+      scored together and the best one is returned (or None)
+    """
+
+    h, w = img_edge.shape[:2]
+
+    outlines = cv2.findContours(img_edge, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    if not outlines:
+        return None
+
+    # bounding box of every fragment at once: stack all outline points and
+    # reduce them per fragment
+    lengths = np.fromiter((len(outline) for outline in outlines), int, len(outlines))
+    points = np.concatenate(outlines).reshape(-1, 2)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    extent = np.maximum.reduceat(points, starts) - np.minimum.reduceat(points, starts)
+    spans = (extent[:, 0] >= min_extent * w) | (extent[:, 1] >= min_extent * h)
+    if not spans.any():
+        return None
+
+    # the spanning fragments with the largest bounding boxes, plus all of
+    # them merged
+    kept = np.flatnonzero(spans)
+    kept = kept[np.argsort(np.prod(extent[kept], axis=1))[::-1][:keep]]
+    hulls = [cv2.convexHull(outlines[i]) for i in kept]
+    hulls.append(cv2.convexHull(points[np.repeat(spans, lengths)]))
+
+    # collect every four-point approximation, then score them all together
+    quads = []
+    for hull in hulls:
+        perimeter = cv2.arcLength(hull, True)
+        for accuracy in (0.02, 0.03, 0.05):
+            approx = cv2.approxPolyDP(hull, accuracy * perimeter, True)
+            if len(approx) == 4:
+                quads.append(approx.reshape(4, 2))
+    if not quads:
+        return None
+
+    quads = np.array(quads, dtype=np.float32)
+    scores = scorequads(quads, img_edge.shape)
+    best = int(np.argmax(scores))
+    if scores[best] <= 0:
+        return None
+    return quads[best]
+
+
+"""
+Detectors
+"""
+
+
+def equalized(img_scaled):
+    """
+    GRAYSCALE + CLAHE (LOCAL CONTRAST EQUALIZATION) + LIGHT BLUR
+    - brings out paper edges that the global Canny thresholds of preprocess()
+      miss under uneven lighting or low contrast
+    """
+
+    img_gray = cv2.cvtColor(img_scaled, cv2.COLOR_BGR2GRAY)
+    img_gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(img_gray)
+    return cv2.GaussianBlur(img_gray, (7, 7), 0)
+
+
+@register("candidates", cost=0)
+def candidatedetector(img_scaled, img_edge):
+    """
+    VECTORIZED FRAGMENT FILTERING + QUAD SCORING (getcandidates)
+    """
+
+    return getcandidates(img_edge)
+
+
+@register("contour", cost=1)
+def contourdetector(img_scaled, img_edge):
+    """
+    CONVEX HULL + DOUGLAS-PEUCKER ON THE LARGEST OUTLINES (gethull, getcorners)
+    """
+
+    corners = getcorners(gethull(img_edge))
+    return None if corners is None else corners.reshape(4, 2)
+
+
+@register("clahe", cost=2)
+def clahedetector(img_scaled, img_edge):
+    """
+    LOCAL CONTRAST EQUALIZATION + ADAPTIVE THRESHOLD + MINIMUM AREA RECTANGLE
+    - copes with uneven lighting and low contrast between paper and background
+    """
+
+    # dark-on-light and light-on-dark transitions both end up as white lines
+    img_thresh = cv2.adaptiveThreshold(
+        equalized(img_scaled), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV, 31, 7,
+    )
+    kernel = np.ones((5, 5), np.uint8)
+    img_closed = cv2.morphologyEx(img_thresh, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+    outlines = cv2.findContours(img_closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    if not outlines:
+        return None
+    outline = max(outlines, key=cv2.contourArea)
+
+    # prefer an exact quadrilateral, fall back to the enclosing rectangle
+    approx = cv2.approxPolyDP(outline, 0.02 * cv2.arcLength(outline, True), True)
+    if len(approx) == 4:
+        return approx.reshape(4, 2)
+    return cv2.boxPoints(cv2.minAreaRect(outline))
+
+
+@register("hough", cost=3)
+def houghdetector(img_scaled, img_edge):
+    """
+    PROBABILISTIC HOUGH LINES, GROUPED INTO THE FOUR SIDES AND INTERSECTED
+    - finds documents whose outline is broken up by fingers, shadows or glare
+    """
+
+    # use lower edge thresholds on the equalized image than preprocess() does
+    img_lines = cv2.Canny(equalized(img_scaled), 30, 90)
+    img_lines = cv2.dilate(img_lines, np.ones((3, 3), np.uint8))
+
+    h, w = img_lines.shape[:2]
+    lines = cv2.HoughLinesP(
+        img_lines, 1, np.pi / 180, threshold=60,
+        minLineLength=min(h, w) // 6, maxLineGap=15,
+    )
+    if lines is None or len(lines) < 4:
+        return None
+    lines = lines.reshape(-1, 4).astype(np.float32)
+
+    # split into horizontal and vertical segments by their angle
+    dx = lines[:, 2] - lines[:, 0]
+    dy = lines[:, 3] - lines[:, 1]
+    angle = np.degrees(np.abs(np.arctan2(dy, dx)))
+    angle = np.minimum(angle, 180 - angle)
+    horizontal = lines[angle < 30]
+    vertical = lines[angle > 60]
+    if len(horizontal) < 2 or len(vertical) < 2:
+        return None
+
+    def side(group, axis, outer, extent):
+        # average all segments within 5% of the outermost one into one line,
+        # returned in homogeneous form so intersections are cross products
+        centers = (group[:, axis] + group[:, axis + 2]) / 2
+        edge = centers.min() if outer == "min" else centers.max()
+        near = group[np.abs(centers - edge) <= 0.05 * extent]
+        pts = near.reshape(-1, 2)
+        vx, vy, x0, y0 = cv2.fitLine(pts, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+        return np.cross([x0, y0, 1.0], [x0 + vx, y0 + vy, 1.0]), edge
+
+    top, top_at = side(horizontal, 1, "min", h)
+    bottom, bottom_at = side(horizontal, 1, "max", h)
+    left, left_at = side(vertical, 0, "min", w)
+    right, right_at = side(vertical, 0, "max", w)
+    if bottom_at - top_at < 0.2 * h or right_at - left_at < 0.2 * w:
+        return None
+
+    corners = []
+    for a, b in ((top, left), (top, right), (bottom, right), (bottom, left)):
+        x, y, z = np.cross(a, b)
+        if abs(z) < 1e-9:
+            return None
+        corners.append((x / z, y / z))
+    corners = np.array(corners, dtype=np.float32)
+
+    # intersections far outside the frame mean the sides were not a document
+    margin = 0.1 * max(h, w)
+    if np.any(corners < -margin) or np.any(corners[:, 0] > w + margin) or \
+            np.any(corners[:, 1] > h + margin):
+        return None
+
+    return corners
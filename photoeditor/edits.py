@@ -0,0 +1,600 @@
+import io
+import os
+import sys
+import json
+import time
+import math
+import bisect
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from inputs import collectinputs, mirrorpaths
+from history import HistoryStore
+
+# every this many steps the state is stored as a keyframe snapshot
+KEYFRAME_EVERY = 4
+
+# number of rebuilt states kept for instant undo / redo
+RECENT_STATES = 2
+
+# mean difference (levels) a replayed step may have from the image it
+# recorded; a step that replays further off is kept as a keyframe
+REPLAY_TOLERANCE = 2.0
+
+# largest copy (pixels) a recorded step is replayed on to check it; bigger
+# pictures are checked on a scaled-down copy, which keeps append() quick
+VERIFY_PIXELS = 512 * 512
+
+# version of the recipe file format
+RECIPE_VERSION = 1
+
+# largest working copy (pixels) the editor edits instead of a big picture
+PROXY_PIXELS = 3 * 1024 * 1024
+
+# operation name -> function(image, op, redetect) returning the edited image
+OPERATIONS = {}
+
+
+def operation(name):
+    """
+    ADD AN EDIT OPERATION TO THE REGISTRY
+    - an operation is a JSON-like dict {"op": name, ...parameters}; the
+      registered function replays it on a PIL image
+    """
+
+    def decorator(func):
+        OPERATIONS[name] = func
+        return func
+
+    return decorator
+
+
+"""
+Operations
+"""
+
+
+def orderpoints(pts):
+    """
+    FOUR CORNERS IN TOP-LEFT, TOP-RIGHT, BOTTOM-RIGHT, BOTTOM-LEFT ORDER
+    - the same ordering as cvtools.order_points, kept here so the editor
+      doesn't need the scanner's helpers
+    """
+
+    pts = np.asarray(pts, dtype=np.float32).reshape(4, 2)
+    total = pts.sum(axis=1)
+    diff = np.diff(pts, axis=1).ravel()
+    return np.array(
+        [pts[np.argmin(total)], pts[np.argmin(diff)], pts[np.argmax(total)], pts[np.argmax(diff)]],
+        dtype=np.float32,
+    )
+
+
+def cropop(corners, source, cropped, stage=None, from_original=False):
+    """
+    RECORD A PERSPECTIVE CROP
+    - "corners" are the four corners in "source" pixel coordinates (any
+      order) and "cropped" is the result; both the corners and the output
+      size are stored relative to the source size, so the crop can be
+      replayed at another resolution;
+    - "stage" is the PhotoCropper stage ("outer" / "inner") for re-detection;
+    - "from_original" marks crops taken from the original picture instead
+      of the previous state (the manual crop works that way)
+    """
+
+    w, h = source.size
+    corners = np.asarray(corners, dtype=np.float64).reshape(4, 2)
+    return {
+        "op": "crop",
+        "corners": (corners / [w, h]).tolist(),
+        "size": [cropped.size[0] / float(w), cropped.size[1] / float(h)],
+        "stage": stage,
+        "source": "original" if from_original else "previous",
+    }
+
+
+@operation("crop")
+def crop(image, op, redetect=False):
+    """
+    WARP THE RECORDED CORNERS TO A RECTANGLE OF THE RECORDED SIZE
+    - with "redetect", the PhotoCropper stage is detected again on this
+      image instead, for recipes applied to other pictures
+    """
+
+    if redetect and op.get("stage"):
+        from photo_crop_system import PhotoCropper
+
+        img_bgr = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+        result = PhotoCropper(image_array=img_bgr).crop_next_stage_auto(stage=op["stage"])
+        if result is None:
+            return image
+        return Image.fromarray(cv2.cvtColor(result[0], cv2.COLOR_BGR2RGB))
+
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    w, h = image.size
+    corners = orderpoints(np.array(op["corners"], dtype=np.float32) * [w, h])
+    out_w = max(1, int(round(op["size"][0] * w)))
+    out_h = max(1, int(round(op["size"][1] * h)))
+    target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], dtype=np.float32)
+
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    warped = cv2.warpPerspective(np.array(image), matrix, (out_w, out_h))
+    return Image.fromarray(warped, image.mode)
+
+
+def jpegop(quality, from_original=False):
+    """
+    RECORD A JPEG COMPRESSION AT "quality"
+    - "from_original" marks a compression of the original picture instead
+      of the previous state (the compression analysis works that way)
+    """
+
+    op = {"op": "jpeg", "quality": int(quality)}
+    if from_original:
+        op["source"] = "original"
+    return op
+
+
+@operation("jpeg")
+def jpeg(image, op, redetect=False):
+    """
+    ENCODE AND DECODE AT THE RECORDED JPEG QUALITY
+    """
+
+    if image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=op["quality"])
+    result = Image.open(buffer)
+    result.load()
+    return result
+
+
+def retouchop(before, after):
+    """
+    RECORD A LOCAL PIXEL EDIT (E.G. GLARE REMOVAL) AS A PATCH
+    - stores the bounding box of the changed pixels, the new pixels in it
+      and which of them changed (PNG); returns None when the edit changed
+      the image size or mode, which can only be kept as a keyframe;
+    - the size of the edited image is stored too, so an edit made on a
+      preview proxy can be replayed on the full-resolution picture;
+    - patches belong to one picture, so recipes leave them out
+    """
+
+    if before.size != after.size or before.mode != after.mode:
+        return None
+
+    changed = np.asarray(before) != np.asarray(after)
+    if changed.ndim == 3:
+        changed = changed.any(axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    cols = np.flatnonzero(changed.any(axis=0))
+    if len(rows) == 0:
+        return {"op": "retouch", "box": None, "patch": None, "size": list(before.size)}
+
+    box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+    buffer = io.BytesIO()
+    after.crop(box).save(buffer, "PNG", compress_level=1)
+    mask = io.BytesIO()
+    Image.fromarray(changed[box[1]:box[3], box[0]:box[2]]).save(mask, "PNG")
+    return {
+        "op": "retouch",
+        "box": list(box),
+        "patch": buffer.getvalue(),
+        "mask": mask.getvalue(),
+        "size": list(before.size),
+    }
+
+
+@operation("retouch")
+def retouch(image, op, redetect=False):
+    """
+    PASTE THE RECORDED PATCH BACK
+    - on a larger copy of the picture the edit was made on, the change the
+      patch made (not the patch itself) is scaled up and added, which keeps
+      the detail of the larger picture
+    """
+
+    if op["box"] is None:
+        return image
+    patch = Image.open(io.BytesIO(op["patch"]))
+    if op.get("size") is None or tuple(op["size"]) == image.size:
+        image = image.copy()
+        image.paste(patch, tuple(op["box"][:2]))
+        return image
+
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    sx = image.width / float(op["size"][0])
+    sy = image.height / float(op["size"][1])
+    left, top, right, bottom = op["box"]
+    box = (
+        int(left * sx), int(top * sy),
+        min(image.width, math.ceil(right * sx)), min(image.height, math.ceil(bottom * sy)),
+    )
+
+    region = np.asarray(image.crop(box), dtype=np.float32)
+    before = cv2.resize(region, patch.size, interpolation=cv2.INTER_AREA)
+    change = np.asarray(patch.convert(image.mode), dtype=np.float32) - before
+    mask = np.asarray(Image.open(io.BytesIO(op["mask"])), dtype=np.float32)
+    change *= mask if change.ndim == 2 else mask[..., None]
+
+    change = cv2.resize(change, (region.shape[1], region.shape[0]), interpolation=cv2.INTER_LINEAR)
+    region = np.clip(np.rint(region + change), 0, 255).astype(np.uint8)
+    image = image.copy()
+    image.paste(Image.fromarray(region, image.mode), box[:2])
+    return image
+
+
+def portable(op):
+    """
+    WHETHER AN OPERATION CAN BE REPLAYED ON ANOTHER PICTURE
+    """
+
+    return op is not None and op["op"] != "retouch"
+
+
+def applyop(image, op, original=None, redetect=False):
+    """
+    REPLAY ONE OPERATION ON "image" (OR ON "original" FOR CROPS FROM IT)
+    """
+
+    if op.get("source") == "original" and original is not None:
+        image = original
+    return OPERATIONS[op["op"]](image, op, redetect)
+
+
+def replay(image, steps, progress=None):
+    """
+    REPLAY EVERY RECORDED STEP, PATCHES INCLUDED, ON "image"
+    - redoes the edits made on a preview proxy on the full picture;
+    - "progress" is called with the fraction of the steps done
+    """
+
+    original = image
+    for index, op in enumerate(steps):
+        if progress:
+            progress(index / float(len(steps)))
+        image = applyop(image, op, original)
+    if progress:
+        progress(1.0)
+    return image
+
+
+def loadproxy(path, pixels=PROXY_PIXELS):
+    """
+    OPEN A PICTURE AS A WORKING COPY OF AT MOST "pixels" PIXELS
+    - returns (image, full size); a picture that is small enough is
+      returned whole;
+    - JPEGs are decoded at a reduced scale right away, so the full picture
+      is never decoded
+    """
+
+    image = Image.open(path)
+    full_size = image.size
+    w, h = full_size
+    if w * h > pixels:
+        scale = math.sqrt(pixels / float(w * h))
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        image.draft(None, size)
+        if image.mode in ("1", "P"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image = image.resize(size, Image.LANCZOS)
+    else:
+        image.load()
+    return image, full_size
+
+
+def shrink(image, scale):
+    """
+    "image" SCALED BY "scale" (AT MOST 1), FOR QUICK CHECKS
+    """
+
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(round(image.width * scale))), max(1, int(round(image.height * scale))))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+"""
+Edit Log
+"""
+
+
+class EditLog:
+    """
+    UNDO / REDO HISTORY THAT RECORDS OPERATIONS INSTEAD OF IMAGES
+    - step 0 is the original picture, every later step the operation that
+      produced it; append(image, op) records a step and its result;
+    - the original, every KEYFRAME_EVERY-th state and the results of steps
+      that can't be replayed (op None) are kept as keyframes in a
+      HistoryStore; any other state is rebuilt by replaying from the
+      nearest keyframe before it;
+    - a step is replayed once when it is recorded; when the replay doesn't
+      give back its image, the step is kept as a keyframe and recorded as
+      not replayable, so operations() and recipe() don't hand it on;
+    - len() and [index] cover the states up to the current one, like the
+      list of images it replaces; undo() / redo() move along the steps and
+      a new append() drops the undone ones
+    """
+
+    def __init__(self, keyframe_every=KEYFRAME_EVERY, ram_budget=None):
+        self.keyframe_every = keyframe_every
+        self._steps = []
+        self._tip = -1
+        self._keyindex = []
+        if ram_budget is None:
+            self._keyframes = HistoryStore(keep_recent=1)
+        else:
+            self._keyframes = HistoryStore(ram_budget, keep_recent=1)
+        self._recent = OrderedDict()
+
+    def __len__(self):
+        return self._tip + 1
+
+    def __getitem__(self, index):
+        index = range(self._tip + 1)[index]
+        image = self._recent.get(index)
+        if image is not None:
+            self._recent.move_to_end(index)
+            return image
+
+        # replay from the nearest keyframe at or before "index"
+        pos = bisect.bisect_right(self._keyindex, index) - 1
+        image = self._keyframes[pos]
+        for step in range(self._keyindex[pos] + 1, index + 1):
+            op = self._steps[step]
+            original = self._keyframes[0] if op.get("source") == "original" else None
+            image = applyop(image, op, original)
+        self._remember(index, image)
+        return image
+
+    @property
+    def canundo(self):
+        return self._tip > 0
+
+    @property
+    def canredo(self):
+        return self._tip < len(self._steps) - 1
+
+    def append(self, image, op=None):
+        """
+        RECORD A NEW STATE "image" PRODUCED BY "op" (None: NOT REPLAYABLE)
+        """
+
+        self._truncate()
+        if op is not None and not self._replays(op, image):
+            op = None
+        keyframe = op is None or len(self._steps) % self.keyframe_every == 0
+        self._steps.append(op)
+        self._tip = index = len(self._steps) - 1
+        if keyframe:
+            self._keyframes.append(image)
+            self._keyindex.append(index)
+        self._remember(index, image)
+
+    def undo(self):
+        """
+        STEP BACK; RETURNS THE NOW CURRENT STATE
+        """
+
+        if self.canundo:
+            self._tip -= 1
+        return self[-1]
+
+    def redo(self):
+        """
+        STEP FORWARD AGAIN; RETURNS THE NOW CURRENT STATE
+        """
+
+        if self.canredo:
+            self._tip += 1
+        return self[-1]
+
+    def clear(self):
+        self._steps = []
+        self._tip = -1
+        self._keyindex = []
+        self._keyframes.clear()
+        self._recent.clear()
+
+    def operations(self):
+        """
+        EVERY OPERATION UP TO THE CURRENT STATE, IN ORDER
+        - None for steps that can't be replayed
+        """
+
+        return self._steps[1:self._tip + 1]
+
+    def recipe(self):
+        """
+        THE REPLAYABLE OPERATIONS UP TO THE CURRENT STATE, IN ORDER
+        """
+
+        return [op for op in self._steps[1:self._tip + 1] if portable(op)]
+
+    def _replays(self, op, image):
+        # whether replaying "op" on the current state gives back "image",
+        # checked on copies of at most VERIFY_PIXELS (operations are
+        # recorded relative to the picture size, so they replay on any scale)
+        if not self._steps:
+            return False
+        source = self._keyframes[0] if op.get("source") == "original" else self[-1]
+        pixels = max(source.width * source.height, image.width * image.height)
+        scale = min(1.0, math.sqrt(VERIFY_PIXELS / float(pixels)))
+        replayed = OPERATIONS[op["op"]](shrink(source, scale), op, False)
+        if replayed.mode != image.mode:
+            return False
+        slack = 0 if scale >= 1.0 else 2
+        if abs(replayed.width - image.width * scale) > slack or abs(replayed.height - image.height * scale) > slack:
+            return False
+        if replayed.size != image.size:
+            image = image.resize(replayed.size, Image.BILINEAR, reducing_gap=2.0)
+
+        replayed, image = np.asarray(replayed), np.asarray(image)
+        if scale < 1.0:
+            # scaling before instead of after the edit moves fine detail
+            # around, so local averages are compared
+            replayed, image = cv2.blur(replayed, (5, 5)), cv2.blur(image, (5, 5))
+        return cv2.absdiff(replayed, image).mean() <= REPLAY_TOLERANCE
+
+    def _truncate(self):
+        # a new step after undo drops the undone steps and their keyframes
+        del self._steps[self._tip + 1:]
+        while self._keyindex and self._keyindex[-1] > self._tip:
+            self._keyindex.pop()
+            self._keyframes.pop()
+        for index in [index for index in self._recent if index > self._tip]:
+            del self._recent[index]
+
+    def _remember(self, index, image):
+        self._recent[index] = image
+        self._recent.move_to_end(index)
+        while len(self._recent) > RECENT_STATES:
+            self._recent.popitem(last=False)
+
+
+"""
+Recipes
+"""
+
+
+def saverecipe(path, steps):
+    """
+    WRITE A RECIPE (LIST OF OPERATIONS) AS JSON
+    """
+
+    with open(path, "w") as f:
+        json.dump({"version": RECIPE_VERSION, "steps": [op for op in steps if portable(op)]}, f, indent=2)
+
+
+def loadrecipe(path):
+    """
+    READ THE OPERATIONS OF A RECIPE FILE
+    """
+
+    with open(path) as f:
+        recipe = json.load(f)
+    if recipe.get("version") != RECIPE_VERSION:
+        raise ValueError(f"Unsupported recipe version: {recipe.get('version')}")
+    for op in recipe["steps"]:
+        if op.get("op") not in OPERATIONS:
+            raise ValueError(f"Unknown operation in recipe: {op.get('op')}")
+    return recipe["steps"]
+
+
+def applyrecipe(image, steps, redetect=False):
+    """
+    REPLAY A RECIPE ON A PICTURE
+    - "redetect" finds the crop corners of every picture again instead of
+      reusing the recorded ones (for pictures framed differently)
+    """
+
+    original = image
+    for op in steps:
+        if portable(op):
+            image = applyop(image, op, original, redetect)
+    return image
+
+
+def applyfile(in_path, out_path, steps, redetect=False):
+    """
+    APPLY A RECIPE TO ONE FILE; RUNS INSIDE A WORKER PROCESS
+    - a recipe ending in a JPEG step is saved as JPEG at that quality;
+    - returns (status, seconds) where status is "ok", "unreadable" or an
+      error message
+    """
+
+    start = time.perf_counter()
+    try:
+        try:
+            image = Image.open(in_path)
+            image.load()
+        except OSError:
+            return "unreadable", time.perf_counter() - start
+
+        image = applyrecipe(image, steps, redetect)
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        if steps and steps[-1]["op"] == "jpeg":
+            image.save(out_path, "JPEG", quality=steps[-1]["quality"])
+        else:
+            image.save(out_path)
+    except Exception as e:
+        return f"error: {e}", time.perf_counter() - start
+    return "ok", time.perf_counter() - start
+
+
+def runrecipe(inputs, steps, output_dir, redetect=False, workers=None):
+    """
+    APPLY A RECIPE TO MANY FILES ACROSS A PROCESS POOL
+    - "inputs" are (path, relative path) pairs, see inputs.collectinputs;
+    - returns the number of files that failed
+    """
+
+    ext = ".jpg" if steps and steps[-1]["op"] == "jpeg" else ".png"
+    total = len(inputs)
+    failed = 0
+    done = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for in_path, out_path in mirrorpaths(inputs, output_dir, ext):
+            futures[pool.submit(applyfile, in_path, out_path, steps, redetect)] = (in_path, out_path)
+
+        for future in as_completed(futures):
+            in_path, out_path = futures[future]
+            status, elapsed = future.result()
+            done += 1
+            if status != "ok":
+                failed += 1
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"[{done}/{total}] {status:<10} {in_path} -> {out_path} ({elapsed:.2f}s, {rate:.1f} img/s)")
+
+    return failed
+
+
+"""
+Main Proccess of the Program
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Apply a recipe of edits saved by the editor to many images.",
+        fromfile_prefix_chars="@",
+    )
+    ap.add_argument("recipe", help="Recipe file saved from the editor.")
+    ap.add_argument(
+        "inputs", nargs="+", metavar="INPUT",
+        help="Directories, glob patterns or image files to edit.",
+    )
+    ap.add_argument("-o", "--output", default="edited", help="Output directory (default: ./edited).")
+    ap.add_argument(
+        "--redetect", action="store_true",
+        help="Detect the crop borders of every image instead of reusing the recorded corners.",
+    )
+    ap.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(),
+        help="Number of worker processes (default: all cores).",
+    )
+    args = ap.parse_args()
+
+    steps = loadrecipe(args.recipe)
+    inputs = collectinputs(args.inputs)
+    if not inputs:
+        print("No images found.", file=sys.stderr)
+        sys.exit(1)
+
+    failed = runrecipe(inputs, steps, args.output, args.redetect, args.workers)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
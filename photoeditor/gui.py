@@ -1,29 +1,71 @@
+import time
+_START = time.perf_counter()
+
+# Heavy modules (cv2, matplotlib, pygame, photo_crop_system, the analysis
+# and edit modules) are imported where they are first used, so the window
+# shows before they load
 import customtkinter as ctk
 from customtkinter import filedialog
-from PIL import Image, ImageDraw, ImageFilter, ImageTk
-import cv2
+from PIL import Image, ImageFilter, ImageTk
 import numpy as np
 import io
+import copy
 import threading
 import os
-import pygame
 from tkinter import messagebox, Canvas, Label, Tk
-from skimage.metrics import peak_signal_noise_ratio as psnr
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import mean_squared_error as mse
-import matplotlib.pyplot as plt
-from photo_crop_system import PhotoCropper, close_all_plots
+from contextlib import contextmanager
+from scancache import ScanCache, DEFAULT_CACHE_DIR
+from pyramid import ImagePyramid
+from jobs import JobScheduler
+import argparse
 import tempfile
 import atexit
 import sys
 
-atexit.register(close_all_plots)
 
+class StartupProfile:
+    """Times of the startup phases, printed with --profile-startup."""
 
-class App(ctk.CTk):
     def __init__(self):
-        super().__init__()
+        self.enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.report(name, time.perf_counter() - start)
+
+    def report(self, name, seconds):
+        if self.enabled:
+            since_start = time.perf_counter() - _START
+            print(f"[startup] {name:<24} {seconds * 1000:8.1f} ms  (at {since_start * 1000:.0f} ms)")
+
+
+startup = StartupProfile()
+startup_imports = time.perf_counter() - _START
+
+
+def close_plots():
+    """Close the matplotlib windows, if plotting was ever loaded."""
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close('all')
+    if "photo_crop_system" in sys.modules:
+        sys.modules["photo_crop_system"].close_all_plots()
+
+
+atexit.register(close_plots)
+
+
+class App(ctk.CTk):
+    def __init__(self, proxy_editing=True):
+        startup.report("imports", startup_imports)
+        with startup.phase("window"):
+            super().__init__()
         self.crop_stage = 1
+        # Large pictures are edited as a preview proxy and saved at full resolution
+        self.proxy_editing = proxy_editing
         self.title("PyImgScan GUI")
         self.geometry("1024x768")
         ctk.set_appearance_mode("System")
@@ -36,24 +78,32 @@ class App(ctk.CTk):
         self.bg_audio_path = os.path.join(media_dir, "index.mp3")
         self.bg_sound = None
 
-        # Start looping background audio
-        self._init_background_audio()
-
-        self.welcome_frame = WelcomeFrame(self, self.show_editor, self.bg_video_path)
-        self.welcome_frame.pack(fill="both", expand=True)
+        with startup.phase("welcome screen"):
+            self.welcome_frame = WelcomeFrame(self, self.show_editor, self.bg_video_path)
+            self.welcome_frame.pack(fill="both", expand=True)
 
         self.editor_frame = None
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # Media start once the window is up
+        self.after_idle(self._first_paint)
+
         self.mainloop()
          
+    def _first_paint(self):
+        startup.report("first paint", time.perf_counter() - _START)
+        # Start looping background audio
+        self._init_background_audio()
+        self.welcome_frame.start_background_video()
+
 
     def on_closing(self):
         """Handle main window closing - force close EVERYTHING."""
-        import matplotlib.pyplot as plt
-    
-        plt.close('all')
-        close_all_plots()
+        close_plots()
+        
+        # Running jobs are cancelled and their results dropped
+        if self.editor_frame is not None:
+            self.editor_frame.jobs.shutdown()
         
         try:
             for widget in self.winfo_children():
@@ -77,37 +127,40 @@ class App(ctk.CTk):
 
     def _init_background_audio(self):
         """Initialize and start looping background audio."""
-        try:
-            print(f"Initializing audio from: {self.bg_audio_path}")
-            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
-            if os.path.isfile(self.bg_audio_path):
-                print("Audio file found, loading...")
-                pygame.mixer.music.load(self.bg_audio_path)
+        print(f"Initializing audio from: {self.bg_audio_path}")
+        if not os.path.isfile(self.bg_audio_path):
+            print(f"Audio file not found: {self.bg_audio_path}")
+            return
+        
+        def play_audio_with_skip():
+            try:
+                # Loading pygame and opening the mixer happen here, off the Tk thread
+                with startup.phase("audio"):
+                    import pygame
+                    pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+                    print("Audio file found, loading...")
+                    pygame.mixer.music.load(self.bg_audio_path)
                 
-                def play_audio_with_skip():
-                    import time
-                    print("Starting audio playback...")
+                print("Starting audio playback...")
+                pygame.mixer.music.play(loops=-1)
+                time.sleep(0.1)
+                try:
+                    pygame.mixer.music.set_pos(5.0)
+                    print("Skipped to 5 seconds")
+                except Exception as e:
+                    print(f"Could not skip audio position: {e}")
+                    time.sleep(5)
+                    pygame.mixer.music.stop()
                     pygame.mixer.music.play(loops=-1)
-                    time.sleep(0.1)
-                    try:
-                        pygame.mixer.music.set_pos(5.0)
-                        print("Skipped to 5 seconds")
-                    except Exception as e:
-                        print(f"Could not skip audio position: {e}")
-                        time.sleep(5)
-                        pygame.mixer.music.stop()
-                        pygame.mixer.music.play(loops=-1)
-                        print("Restarted audio after 5 seconds")
-                
-                audio_thread = threading.Thread(target=play_audio_with_skip, daemon=True)
-                audio_thread.start()
-                print("Audio thread started")
-            else:
-                print(f"Audio file not found: {self.bg_audio_path}")
-        except Exception as e:
-            print(f"Background audio could not be started: {e}")
-            import traceback
-            traceback.print_exc()    
+                    print("Restarted audio after 5 seconds")
+            except Exception as e:
+                print(f"Background audio could not be started: {e}")
+                import traceback
+                traceback.print_exc()
+        
+        audio_thread = threading.Thread(target=play_audio_with_skip, daemon=True)
+        audio_thread.start()
+        print("Audio thread started")
 
     def show_editor(self, filepath):
         if self.welcome_frame is not None:
@@ -123,8 +176,15 @@ class WelcomeFrame(ctk.CTkFrame):
         self.on_image_select = on_image_select
         self.video_path = video_path
         self.cap = None
+        self.reader = None
         self.video_running = False
         self.video_ctk_image = None
+        # Frame interval adapts to the measured render cost: drawing may use
+        # at most 1/render_share of the time, and never less than min_frame_ms
+        self.render_share = 4
+        self.min_frame_ms = 33
+        self.max_frame_ms = 200
+        self._render_ms = 0.0
 
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -132,9 +192,8 @@ class WelcomeFrame(ctk.CTkFrame):
         self.video_label = ctk.CTkLabel(self, text="", fg_color="transparent")
         self.video_label.grid(row=0, column=0, sticky="nsew")
         
-        self.gradient_mask = None
         self.current_text_overlay = ""
-        self._create_gradient_mask()
+        self.compositor = None
 
         self.button_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.button_frame.place(relx=0.5, rely=0.78, anchor="center")
@@ -152,7 +211,6 @@ class WelcomeFrame(ctk.CTkFrame):
         )
         self.select_image_button.pack()
 
-        self.start_background_video()
         self._typing_text = "Save Your Memories"
         self._typing_index = 0
         self._start_typing_effect()
@@ -171,16 +229,23 @@ class WelcomeFrame(ctk.CTkFrame):
             print(f"Video file not found: {self.video_path}")
             return
         try:
-            print(f"Attempting to open video: {self.video_path}")
-            self.cap = cv2.VideoCapture(self.video_path)
-            if not self.cap.isOpened():
-                print(f"Could not open video file: {self.video_path}")
-                alt_path = self.video_path.replace("\\", "/")
-                self.cap = cv2.VideoCapture(alt_path)
+            with startup.phase("video"):
+                import cv2
+                from compositor import Compositor, VideoReader
+
+                print(f"Attempting to open video: {self.video_path}")
+                self.cap = cv2.VideoCapture(self.video_path)
                 if not self.cap.isOpened():
-                    self.cap = None
-                    return
-            print("Video opened successfully")
+                    print(f"Could not open video file: {self.video_path}")
+                    alt_path = self.video_path.replace("\\", "/")
+                    self.cap = cv2.VideoCapture(alt_path)
+                    if not self.cap.isOpened():
+                        self.cap = None
+                        return
+                print("Video opened successfully")
+                self.compositor = Compositor()
+                self.reader = VideoReader(self.cap)
+                self.reader.start()
             self.video_running = True
             self.after(200, self._update_video_frame)
         except Exception as e:
@@ -190,119 +255,58 @@ class WelcomeFrame(ctk.CTkFrame):
             self.cap = None
 
     def _update_video_frame(self):
-        """Read next frame from video and display it, looping when needed."""
-        if not self.video_running or self.cap is None:
+        """Show the next decoded frame; the reader loops the video."""
+        if not self.video_running or self.reader is None:
             return
 
         try:
-            ret, frame = self.cap.read()
-            if not ret:
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                ret, frame = self.cap.read()
-                if not ret:
-                    print("Failed to read video frame after loop")
-                    return
-
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            self.update_idletasks()
+            start = time.perf_counter()
             w = self.winfo_width()
             h = self.winfo_height()
             
             if w < 100 or h < 100:
                 w, h = 1024, 768
             
-            frame_resized = cv2.resize(frame, (w, h))
-            image = Image.fromarray(frame_resized).convert("RGBA")
-            
-            try:
-                overlay_alpha = int(255 * 0.50)
-                overlay_img = Image.new("RGBA", (w, h), (0, 0, 0, overlay_alpha))
-                image = Image.alpha_composite(image, overlay_img)
-            except Exception:
-                pass
+            # The reader decodes ahead at the current window size
+            self.reader.size = (w, h)
+            frame = self.reader.get()
+            if frame is None and not self.reader.alive:
+                return
 
-            if self.gradient_mask is not None:
-                gradient_resized = self.gradient_mask.resize((w, h), Image.LANCZOS)
-                image = Image.alpha_composite(image, gradient_resized)
-                
-            if hasattr(self, 'current_text_overlay') and self.current_text_overlay:
-                from PIL import ImageDraw, ImageFont
-                draw = ImageDraw.Draw(image)
-                try:
-                    font = ImageFont.truetype("times.ttf", 42)
-                except:
-                    try:
-                        font = ImageFont.truetype("arial.ttf", 42)
-                    except:
-                        try:
-                            import platform
-                            if platform.system() == "Windows":
-                                font = ImageFont.truetype("C:/Windows/Fonts/times.ttf", 42)
-                            else:
-                                font = ImageFont.load_default()
-                        except:
-                            font = ImageFont.load_default()
-                try:
-                    bbox = draw.textbbox((0, 0), self.current_text_overlay, font=font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                except Exception:
-                    text_width, text_height = draw.textsize(self.current_text_overlay, font=font)
-                text_x = (w - text_width) // 2
-                text_y = int(h * 0.22) - text_height // 2
-                draw.text((text_x+2, text_y+2), self.current_text_overlay, fill=(0,0,0,200), font=font)
-                draw.text((text_x, text_y), self.current_text_overlay, fill="white", font=font)
-            
-            image_rgb = image.convert("RGB")
+            if frame is not None:
+                image = self.compositor.compose(frame, self.current_text_overlay, (w, h))
+                self._show_video_image(image)
+                render_ms = (time.perf_counter() - start) * 1000
+                self._render_ms = 0.8 * self._render_ms + 0.2 * render_ms if self._render_ms else render_ms
 
-            self.video_ctk_image = ctk.CTkImage(light_image=image_rgb, dark_image=image_rgb, size=(w, h))
-            self.video_label.configure(image=self.video_ctk_image, text="")
+            # Slow renders get more time per frame; skipped video frames keep
+            # the playback speed
+            video_ms = 1000 / self.reader.fps
+            delay = min(self.max_frame_ms, max(self.min_frame_ms, video_ms, self._render_ms * self.render_share))
+            self.reader.step = max(1, round(delay / video_ms))
 
-            self.after(33, self._update_video_frame)
+            self.after(int(delay), self._update_video_frame)
         except Exception as e:
             print(f"Error updating video frame: {e}")
             import traceback
             traceback.print_exc()
             self.video_running = False
 
-    def _create_gradient_mask(self):
-        """Create a gradient mask that will be composited onto video frames."""
-        def update_gradient_mask():
-            try:
-                w = self.master.winfo_width()
-                h = self.master.winfo_height()
-                if w < 10 or h < 10:
-                    self.after(100, update_gradient_mask)
-                    return
-                
-                border_width = min(w, h) * 0.15
-                
-                y_coords, x_coords = np.ogrid[:h, :w]
-                
-                dist_top = y_coords
-                dist_bottom = h - y_coords
-                dist_left = x_coords
-                dist_right = w - x_coords
-                
-                min_dist = np.minimum(np.minimum(dist_top, dist_bottom), 
-                                     np.minimum(dist_left, dist_right))
-                
-                max_grad_alpha = int(255 * 0.60)
-                alpha = np.where(
-                    min_dist < border_width,
-                    (max_grad_alpha * (1 - (min_dist / border_width))),
-                    0,
-                ).astype(np.uint8)
-                
-                gradient_array = np.zeros((h, w, 4), dtype=np.uint8)
-                gradient_array[:, :, 3] = alpha
-                
-                self.gradient_mask = Image.fromarray(gradient_array, "RGBA")
-            except Exception as e:
-                print(f"Error creating gradient mask: {e}")
-        
-        self.after(200, update_gradient_mask)
+    def _show_video_image(self, image):
+        """Put a frame on the label, drawing into the shown image if possible."""
+        size = image.size
+        if self.video_ctk_image is None or self.video_ctk_image.cget("size") != size:
+            self.video_ctk_image = ctk.CTkImage(light_image=image, dark_image=image, size=size)
+            self.video_label.configure(image=self.video_ctk_image, text="")
+            return
+
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.video_label)
+        photo = self.video_ctk_image.create_scaled_photo_image(scaling, ctk.get_appearance_mode().lower())
+        if (photo.width(), photo.height()) == size:
+            photo.paste(image)
+        else:
+            # Scaled for a HighDPI display: let the image rescale itself
+            self.video_ctk_image.configure(light_image=image, dark_image=image)
 
     def _start_typing_effect(self):
         """Display text letter by letter like someone is writing it."""
@@ -315,9 +319,12 @@ class WelcomeFrame(ctk.CTkFrame):
     def stop_background_video(self):
         """Stop updating the background video."""
         self.video_running = False
-        if self.cap is not None:
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        elif self.cap is not None:
             self.cap.release()
-            self.cap = None
+        self.cap = None
 
 
 class SimpleCropDialog(ctk.CTkToplevel):
@@ -328,7 +335,7 @@ class SimpleCropDialog(ctk.CTkToplevel):
         self.master = master
         
         self.title("Crop Options")
-        self.geometry("400x250")
+        self.geometry("400x290")
         self.transient(master)
         self.resizable(False, False)
         
@@ -366,61 +373,173 @@ class SimpleCropDialog(ctk.CTkToplevel):
             font=ctk.CTkFont(size=14)
         )
         btn_manual.pack(pady=10, padx=40, fill="x")
+        self.buttons = [btn_auto, btn_manual]
+        
+        self.progress_bar = ctk.CTkProgressBar(self, mode='indeterminate')
         
         self.after(20, self.grab_set)
     
     def on_dialog_close(self):
         """Handle dialog close button."""
+        self.master.jobs.cancel("crop")
         self.grab_release()
         self.destroy()
     
     def crop_automatic(self):
-        """Automatic crop - detects border and crops."""
+        """Automatic crop - detects border and crops in the background."""
+        # Loaded here, on the Tk thread, since it sets up a plotting backend
+        from photo_crop_system import PhotoCropper
+
+        if self.master.crop_stage == 1:
+            stage = "outer"
+        else:
+            stage = "inner"
+        
+        for btn in self.buttons:
+            btn.configure(state="disabled")
+        self.progress_bar.pack(pady=10, padx=40, fill="x")
+        self.progress_bar.start()
+        
+        # The worker runs its own copy of the cropper, so a cancelled job leaves
+        # the editor's cropper as it was; without a copy, it is rebuilt from the chain
         try:
-            if self.master.photo_cropper is None:
-                img_array = cv2.cvtColor(np.array(self.master.current_image), cv2.COLOR_RGB2BGR)
-                self.master.photo_cropper = PhotoCropper(image_array=img_array)
-            
-            cropper = self.master.photo_cropper
-            
-            if self.master.crop_stage == 1:
-                stage = "outer"
-            else:
-                stage = "inner"
-            
-            result = cropper.crop_next_stage_auto(stage=stage)
-            
-            if result is None:
-                messagebox.showinfo(
-                    "No Border Detected", 
-                    f"No {stage} border detected in the image.\nThe image may already be fully cropped."
-                )
-                self.master.photo_cropper = None
-                self.destroy()
-                return
-            
-            cropped, corners, stage_num = result
-            
-            img_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(img_rgb)
-            
-            self.master.add_to_history(pil_image)
-            self.master.display_image(pil_image)
-            self.master.crop_stage += 1
-            
-            print(f"✓ Automatic {stage} crop complete - Stage {self.master.crop_stage}")
-            
-            self.destroy()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Automatic cropping failed:\n{str(e)}")
-            import traceback
-            traceback.print_exc()
+            cropper = copy.deepcopy(self.master.photo_cropper)
+        except Exception:
+            cropper = None
+        
+        source = self.master.current_image
+        self.master.jobs.submit(
+            "crop", self._detect_crop, source, stage, cropper, self.master.crop_chain, PhotoCropper,
+            on_done=lambda result: self._apply_crop(source, stage, result),
+            on_error=self._crop_failed,
+        )
+    
+    def _detect_crop(self, job, source, stage, cropper, chain, PhotoCropper):
+        """Find the crop on a worker thread: (image, corners, cropper, chain) or None."""
+        import cv2
+
+        # A stage continues the cropper of the stages before it; "chain" is
+        # the picture that cropper started on and the stages it ran
+        if chain is None:
+            root, stages = source, ()
+        else:
+            root, stages = chain
+        chain = (root, stages + (stage,))
+
+        # Same picture and stages as before: reuse the cached crop
+        key = self._crop_cache_key(root, chain[1])
+        record, png = self._cached_crop(key)
+        if record is not None:
+            if record["corners"] is None:
+                return None
+            if png is not None:
+                pil_image = Image.open(io.BytesIO(png))
+                pil_image.load()
+                # No cropper ran this stage; a later miss rebuilds one from the chain
+                return pil_image, record["corners"], None, chain
+        job.check()
+        
+        if cropper is None:
+            # Rebuild the cropper of the chain, including stages served from the cache
+            img_array = cv2.cvtColor(np.array(root), cv2.COLOR_RGB2BGR)
+            cropper = PhotoCropper(image_array=img_array)
+            for done in stages:
+                cropper.crop_next_stage_auto(stage=done)
+                job.check()
+        
+        result = cropper.crop_next_stage_auto(stage=stage)
+        job.check()
+        
+        if result is None:
+            self._store_crop_in_cache(key, None, None)
+            return None
+        
+        cropped, corners, stage_num = result
+        self._store_crop_in_cache(key, cropped, corners)
+        
+        img_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(img_rgb), corners, cropper, chain
+    
+    def _apply_crop(self, source, stage, result):
+        if result is None:
+            messagebox.showinfo(
+                "No Border Detected", 
+                f"No {stage} border detected in the image.\nThe image may already be fully cropped."
+            )
             self.master.photo_cropper = None
+            self.master.crop_chain = None
             self.destroy()
+            return
+        
+        from edits import cropop
+
+        pil_image, corners, cropper, chain = result
+        self.master.photo_cropper = cropper
+        self.master.crop_chain = chain
+        op = cropop(corners, source, pil_image, stage=stage)
+        self.master.add_to_history(pil_image, op)
+        self.master.display_image(pil_image)
+        self.master.crop_stage += 1
+        
+        print(f"✓ Automatic {stage} crop complete - Stage {self.master.crop_stage}")
+        
+        self.destroy()
     
+    def _crop_failed(self, error):
+        messagebox.showerror("Error", f"Automatic cropping failed:\n{str(error)}")
+        import traceback
+        traceback.print_exception(type(error), error, error.__traceback__)
+        self.master.photo_cropper = None
+        self.master.crop_chain = None
+        self.destroy()
+    
+    def _crop_cache_key(self, source, stages):
+        """Cache key of a picture plus the crop stages run on it."""
+        try:
+            if self.master.crop_cache is None:
+                self.master.crop_cache = ScanCache(DEFAULT_CACHE_DIR, images=True)
+            img_array = np.ascontiguousarray(source)
+            params = {"tool": "PhotoCropper", "stages": list(stages), "shape": img_array.shape}
+            return self.master.crop_cache.key(img_array, params)
+        except Exception as e:
+            print(f"Crop cache unavailable: {e}")
+            return None
+
+    def _cached_crop(self, key):
+        """Cached (record, PNG bytes) of an automatic crop, or (None, None)."""
+        if key is None:
+            return None, None
+        try:
+            record = self.master.crop_cache.get(key)
+            if record is None or record["corners"] is None:
+                return record, None
+            return record, self.master.crop_cache.getimage(key)
+        except Exception as e:
+            print(f"Crop cache unavailable: {e}")
+            return None, None
+
+    def _store_crop_in_cache(self, key, cropped, corners):
+        """Remember an automatic crop."""
+        import cv2
+
+        if key is None:
+            return
+        try:
+            if cropped is None:
+                self.master.crop_cache.put(key, {"corners": None})
+                return
+            ok, png = cv2.imencode(".png", cropped, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            record = {"corners": np.asarray(corners).tolist()}
+            self.master.crop_cache.put(key, record, png.tobytes() if ok else None)
+        except Exception as e:
+            print(f"Could not cache crop: {e}")
+
     def crop_manual(self):
         """Manual crop - ALWAYS shows original uncropped photo."""
+        import cv2
+        from photo_crop_system import PhotoCropper
+        from edits import cropop
+
         try:
             if len(self.master.image_history) > 0:
                 original_image = self.master.image_history[0]
@@ -439,30 +558,41 @@ class SimpleCropDialog(ctk.CTkToplevel):
             img_rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
             pil_image = Image.fromarray(img_rgb)
             
-            self.master.add_to_history(pil_image)
+            op = cropop(corners, original_image, pil_image, from_original=True)
+            self.master.add_to_history(pil_image, op)
             self.master.display_image(pil_image)
             self.master.crop_stage += 1
             
             print("✓ Manual crop complete")
             
             self.master.photo_cropper = None
+            self.master.crop_chain = None
             
         except Exception as e:
             messagebox.showerror("Error", f"Manual cropping failed:\n{str(e)}")
             import traceback
             traceback.print_exc()
             self.master.photo_cropper = None
+            self.master.crop_chain = None
 
 
 class EditorFrame(ctk.CTkFrame):
     def __init__(self, master, filepath):
         super().__init__(master)
 
-        self.image_history = []
-        self.redo_history = []
+        from edits import EditLog
+
+        # Edits are recorded as operations and replayed from keyframes
+        self.image_history = EditLog()
+        # Heavy operations run here, off the Tk thread
+        self.jobs = JobScheduler(self)
         self.analysis_results = None
+        self.analysis_curve = None
         self.analysis_toplevel = None
         self.photo_cropper = None
+        # Picture and stages of the automatic crops so far (see _detect_crop)
+        self.crop_chain = None
+        self.crop_cache = None
         self.crop_stage = 1
         self.last_jpeg_quality = None
 
@@ -476,6 +606,9 @@ class EditorFrame(ctk.CTkFrame):
         self.sidebar_title = ctk.CTkLabel(self.sidebar_frame, text="Tools", font=ctk.CTkFont(size=20, weight="bold"))
         self.sidebar_title.pack(pady=20)
 
+        self.proxy_label = ctk.CTkLabel(self.sidebar_frame, text="", wraplength=170, font=ctk.CTkFont(size=12))
+        self.proxy_label.pack(padx=15)
+
         brown_color = "#A0522D"
         brown_hover = "#CD853F"
         
@@ -519,6 +652,16 @@ class EditorFrame(ctk.CTkFrame):
             text_color="white"
         )
         self.show_report_button.pack(pady=10, padx=20, fill="x")
+
+        self.save_recipe_button = ctk.CTkButton(
+            self.sidebar_frame, 
+            text="Save Edit Recipe", 
+            command=self.save_recipe,
+            fg_color=brown_color,
+            hover_color=brown_hover,
+            text_color="white"
+        )
+        self.save_recipe_button.pack(pady=10, padx=20, fill="x")
         
         self.change_picture_button = ctk.CTkButton(
             self.sidebar_frame, 
@@ -550,6 +693,13 @@ class EditorFrame(ctk.CTkFrame):
         self.current_image = None
         self._display_image = None
         self._tk_image = None
+        self._pyramid = None
+        # Interactive frames are drawn with a fast filter at most once per
+        # display frame; the LANCZOS pass follows once input settles
+        self.frame_ms = 16
+        self.settle_ms = 150
+        self._frame_job = None
+        self._settle_job = None
         self.zoom_percent = 100
         self.zoom_min = 10
         self.zoom_max = 400
@@ -600,14 +750,39 @@ class EditorFrame(ctk.CTkFrame):
         )
         self.save_button.grid(row=0, column=2, padx=10, pady=10, sticky="ew")
 
-        self.current_image = Image.open(filepath)
+        self.load_picture(filepath)
+        self.update_button_states()
+
+    def load_picture(self, filepath):
+        """Open a picture; a large one is edited as a smaller preview proxy."""
+        from edits import loadproxy
+
+        if self.master.proxy_editing:
+            self.current_image, self.full_size = loadproxy(filepath)
+        else:
+            self.current_image = Image.open(filepath)
+            self.full_size = self.current_image.size
         self.current_image_path = filepath
+        self.crop_stage = 1
         self.add_to_history(self.current_image)
         self.display_image(self.current_image)
-        self.update_button_states()
+
+        if self.is_proxy:
+            w, h = self.current_image.size
+            full_w, full_h = self.full_size
+            self.proxy_label.configure(
+                text=f"Editing a {w * h / 1e6:.1f} MP preview of {full_w * full_h / 1e6:.1f} MP; saved at full resolution"
+            )
+        else:
+            self.proxy_label.configure(text="")
+
+    @property
+    def is_proxy(self):
+        return self.image_history[0].size != self.full_size
 
     def display_image(self, pil_image):
         self.current_image = pil_image.copy()
+        self._pyramid = ImagePyramid(self.current_image)
         self.offset_x = 0
         self.offset_y = 0
         def _fit_when_ready(attempts_left=10):
@@ -647,22 +822,36 @@ class EditorFrame(ctk.CTkFrame):
 
         _fit_when_ready()
 
-    def _redraw_canvas(self):
+    def request_redraw(self):
+        """Redraw for an interaction: coalesced, fast, then refined."""
+        if self._settle_job is not None:
+            self.after_cancel(self._settle_job)
+            self._settle_job = None
+        if self._frame_job is None:
+            self._frame_job = self.after(self.frame_ms, self._draw_frame)
+
+    def _draw_frame(self):
+        self._frame_job = None
+        # Nearest neighbour is 5x cheaper; it only shimmers when zoomed out
+        fast = Image.NEAREST if self.zoom_percent >= 100 else Image.BILINEAR
+        self._redraw_canvas(fast)
+        self._settle_job = self.after(self.settle_ms, self._draw_settled)
+
+    def _draw_settled(self):
+        self._settle_job = None
+        self._redraw_canvas()
+
+    def _redraw_canvas(self, resample=Image.LANCZOS):
         if self.current_image is None:
             return
+        if self._pyramid is None:
+            self._pyramid = ImagePyramid(self.current_image)
 
         canvas_w = max(200, self.canvas.winfo_width())
         canvas_h = max(200, self.canvas.winfo_height())
 
         zoom = max(self.zoom_min, min(self.zoom_max, self.zoom_percent)) / 100.0
-        img_w, img_h = self.current_image.size
-        scaled_w = max(1, int(img_w * zoom))
-        scaled_h = max(1, int(img_h * zoom))
-
-        try:
-            scaled = self.current_image.resize((scaled_w, scaled_h), Image.LANCZOS)
-        except Exception:
-            scaled = self.current_image.copy()
+        scaled_w, scaled_h = self._pyramid.scaledsize(zoom)
 
         max_off_x = max(0, scaled_w - canvas_w)
         max_off_y = max(0, scaled_h - canvas_h)
@@ -673,15 +862,25 @@ class EditorFrame(ctk.CTkFrame):
         top = self.offset_y
         right = left + canvas_w
         bottom = top + canvas_h
+
+        # Only the visible part is resampled, from the nearest pyramid level
+        visible = self._pyramid.render(zoom, (left, top, right, bottom), resample)
         
         if scaled_w < canvas_w or scaled_h < canvas_h:
             bg = Image.new("RGB", (canvas_w, canvas_h), (43,43,43))
             paste_x = max(0, (canvas_w - scaled_w) // 2)
             paste_y = max(0, (canvas_h - scaled_h) // 2)
-            bg.paste(scaled, (paste_x, paste_y))
+            bg.paste(visible, (paste_x, paste_y))
             final = bg
         else:
-            final = scaled.crop((left, top, right, bottom))
+            final = visible
+
+        if final.mode != "RGB":
+            final = final.convert("RGB")
+        # Same canvas size: update the pixels of the existing photo image
+        if self._tk_image is not None and (self._tk_image.width(), self._tk_image.height()) == final.size:
+            self._tk_image.paste(final)
+            return
 
         self._tk_image = ImageTk.PhotoImage(final)
         self.canvas.delete("all")
@@ -711,7 +910,7 @@ class EditorFrame(ctk.CTkFrame):
         else:
             self.offset_x = 0
             self.offset_y = 0
-        self._redraw_canvas()
+        self.request_redraw()
 
     def _on_mouse_wheel(self, event):
         try:
@@ -733,7 +932,7 @@ class EditorFrame(ctk.CTkFrame):
             self.zoom_slider.set(self.zoom_percent)
         except Exception:
             pass
-        self._redraw_canvas()
+        self.request_redraw()
 
     def _on_button_press(self, event):
         self._drag_data['x'] = event.x
@@ -746,7 +945,7 @@ class EditorFrame(ctk.CTkFrame):
         dy = event.y - self._drag_data['y']
         self.offset_x = int(self._drag_data['start_off_x'] - dx)
         self.offset_y = int(self._drag_data['start_off_y'] - dy)
-        self._redraw_canvas()
+        self.request_redraw()
 
     def _on_button_release(self, event):
         self._drag_data['x'] = 0
@@ -754,9 +953,9 @@ class EditorFrame(ctk.CTkFrame):
         self._drag_data['start_off_x'] = 0
         self._drag_data['start_off_y'] = 0
 
-    def add_to_history(self, image):
-        self.image_history.append(image.copy())
-        self.redo_history.clear()
+    def add_to_history(self, image, op=None):
+        """Record a new state; "op" is the edit that produced it, if replayable."""
+        self.image_history.append(image.copy(), op)
         self.update_button_states()
 
     def detect_and_crop(self):
@@ -765,7 +964,10 @@ class EditorFrame(ctk.CTkFrame):
         SimpleCropDialog(self)
 
     def update_and_display_compressed(self, compressed_image):
-        self.add_to_history(self.current_image)
+        from edits import jpegop
+
+        # The analysis compresses the original picture
+        self.add_to_history(compressed_image, jpegop(self.last_jpeg_quality, from_original=True))
         self.display_image(compressed_image)
 
     def open_analysis_options(self):
@@ -776,120 +978,104 @@ class EditorFrame(ctk.CTkFrame):
 
     def show_analysis_report(self):
         if self.analysis_results:
-            AnalysisReportWindow(self, self.analysis_results)
+            AnalysisReportWindow(self, self.analysis_results, self.analysis_curve)
+
+    def run_analysis_job(self, targets_kb, on_progress=None, on_finish=None):
+        """Run the compression analysis in the background; a new run replaces a running one."""
+        def done(result):
+            if on_finish:
+                on_finish()
+            self._analysis_done(result)
+
+        def failed(error):
+            if on_finish:
+                on_finish()
+            messagebox.showerror("Analysis Error", f"An error occurred during analysis:\n{error}")
+
+        # File sizes only mean something for the full picture, so a proxy's
+        # analysis reads the full one
+        full_path = self.current_image_path if self.is_proxy else None
+        self.jobs.submit(
+            "analysis", self.run_analysis, self.image_history[0], targets_kb, full_path,
+            on_done=done, on_error=failed, on_progress=on_progress,
+        )
 
-    def run_analysis_thread(self, targets_kb):
-        thread = threading.Thread(target=self.run_analysis, args=(targets_kb,))
-        thread.daemon = True
-        thread.start()
+    def run_analysis(self, job, image, targets_kb, full_path=None):
+        """Worker side of the analysis; must not touch any widget."""
+        from compression import analyze
+        from edits import jpeg, jpegop
 
-    def run_analysis(self, targets_kb):
-        try:
-            self.analysis_results = []
-            original_image_cv = np.array(self.image_history[0])
-            original_image_cv_rgb = original_image_cv[:, :, ::-1]
+        preview = image
+        if full_path is not None:
+            image = Image.open(full_path)
+            image.load()
+            job.check()
 
-            for target_kb in targets_kb:
-                target_bytes = target_kb * 1024
-                
-                low = 1
-                high = 100
-                found_quality = -1 # Best quality found so far that is AT OR BELOW target
-
-                while low <= high:
-                    quality = (low + high) // 2
-                    if quality == 0: break
-                    
-                    buffer = io.BytesIO()
-                    self.image_history[0].save(buffer, "JPEG", quality=quality)
-                    size_in_bytes = buffer.tell()
-                    
-                    if size_in_bytes <= target_bytes:
-                        # This is a valid candidate, save it
-                        found_quality = quality
-                        # Try for a better quality (and larger size)
-                        low = quality + 1
-                    else:
-                        # Size is too large, reduce quality
-                        high = quality - 1
-                
-                # If no quality setting produces a file small enough, default to lowest quality
-                if found_quality == -1:
-                    found_quality = 1
+        results, rate_curve = analyze(image, targets_kb, progress=job.progress, check=job.check)
+        print(f"Quality search: {rate_curve.probes} full-size encodes for {len(targets_kb)} target(s)")
 
-                buffer = io.BytesIO()
-                self.image_history[0].save(buffer, "JPEG", quality=found_quality)
-                compressed_image = Image.open(buffer)
-                compressed_image_cv = np.array(compressed_image)
+        compressed_image = None
+        if len(targets_kb) == 1 and full_path is not None:
+            # The preview shows the chosen quality on the proxy
+            compressed_image = jpeg(preview, jpegop(results[0]["quality"]))
+        elif len(targets_kb) == 1:
+            compressed_image = Image.open(io.BytesIO(rate_curve.data(results[0]["quality"])))
+            compressed_image.load()
+        return results, rate_curve.curve(), compressed_image
 
-                psnr_val = psnr(original_image_cv_rgb, compressed_image_cv)
-                
-                h, w, _ = original_image_cv_rgb.shape
-                min_dim = min(h, w)
-                win_size = min(7, min_dim)
-                if win_size % 2 == 0:
-                    win_size -= 1
-                
-                if win_size < 3:
-                    ssim_val = 0.0
-                else:
-                    ssim_val = ssim(original_image_cv_rgb, compressed_image_cv, win_size=win_size, channel_axis=-1, data_range=255)
-
-                mse_val = mse(original_image_cv_rgb, compressed_image_cv)
-
-                self.analysis_results.append({
-                    "target_kb": target_kb,
-                    "actual_kb": buffer.tell() / 1024,
-                    "quality": found_quality,
-                    "psnr": psnr_val,
-                    "ssim": ssim_val,
-                    "mse": mse_val
-                })
+    def _analysis_done(self, result):
+        self.analysis_results, self.analysis_curve, compressed_image = result
 
-                if len(targets_kb) == 1:
-                    self.last_jpeg_quality = found_quality
-                    self.after(0, self.update_and_display_compressed, compressed_image)
+        if compressed_image is not None:
+            self.last_jpeg_quality = self.analysis_results[0]["quality"]
+            self.update_and_display_compressed(compressed_image)
 
-            self.show_report_button.configure(state="normal")
-            messagebox.showinfo("Analysis Complete", "The compression analysis is complete. Click 'Show Analysis Report' to see the results.")
-        except Exception as e:
-            messagebox.showerror("Analysis Error", f"An error occurred during analysis:\n{e}")
+        self.show_report_button.configure(state="normal")
+        messagebox.showinfo("Analysis Complete", "The compression analysis is complete. Click 'Show Analysis Report' to see the results.")
 
     def remove_glare(self):
         """Open advanced glare removal dialog."""
         self.last_jpeg_quality = None
         from advanced_glare_dialog import AdvancedGlareRemovalDialog
         
-        dialog = AdvancedGlareRemovalDialog(self, self.current_image)
-        # Wait for dialog to close
-        self.wait_window(dialog)
-        
+        source = self.current_image
+        dialog = AdvancedGlareRemovalDialog(self, source)
+        # Apply the result once the dialog closes, without blocking here
+        self._when_closed(dialog, lambda: self._apply_glare(dialog, source))
+
+    def _when_closed(self, window, callback):
+        if window.winfo_exists():
+            self.after(100, lambda: self._when_closed(window, callback))
+        else:
+            callback()
+
+    def _apply_glare(self, dialog, source):
         # If user selected a method, apply result
         if dialog.result is not None:
-            self.add_to_history(self.current_image)
+            from edits import retouchop
+            self.add_to_history(dialog.result, retouchop(source, dialog.result))
             self.display_image(dialog.result)
 
     def undo(self):
-        if len(self.image_history) > 1:
+        if self.image_history.canundo:
             self.last_jpeg_quality = None
-            self.redo_history.append(self.image_history.pop())
-            self.display_image(self.image_history[-1])
+            self.display_image(self.image_history.undo())
             self.photo_cropper = None
+            self.crop_chain = None
             # Reset crop stage when undoing so you can crop again
             self.crop_stage = 1
         self.update_button_states()
 
     def redo(self):
-        if self.redo_history:
-            self.image_history.append(self.redo_history.pop())
-            self.display_image(self.image_history[-1])
+        if self.image_history.canredo:
+            self.display_image(self.image_history.redo())
         self.update_button_states()
         
     def change_picture(self):
-        plt.close('all')
-        close_all_plots()
+        close_plots()
         
         self.photo_cropper = None
+        self.crop_chain = None
         self.last_jpeg_quality = None
         
         filepath = filedialog.askopenfilename(
@@ -897,22 +1083,34 @@ class EditorFrame(ctk.CTkFrame):
             filetypes=(("Image Files", "*.jpg *.jpeg *.png *.bmp"), ("All files", "*.*"))
         )
         if filepath:
+            self.jobs.cancel("analysis")
             self.image_history.clear()
-            self.redo_history.clear()
             self.analysis_results = None
+            self.analysis_curve = None
             
-            self.current_image = Image.open(filepath)
-            self.current_image_path = filepath
-            self.crop_stage = 1
-            self.add_to_history(self.current_image)
-            self.display_.image(self.current_image)
+            self.load_picture(filepath)
             
             self.show_report_button.configure(state="disabled")
             self.update_button_states()
 
     def update_button_states(self):
-        self.back_button.configure(state="normal" if len(self.image_history) > 1 else "disabled")
-        self.redo_button.configure(state="normal" if self.redo_history else "disabled")
+        self.back_button.configure(state="normal" if self.image_history.canundo else "disabled")
+        self.redo_button.configure(state="normal" if self.image_history.canredo else "disabled")
+
+    def save_recipe(self):
+        """Save the edits so far, to apply them to other pictures with edits.py."""
+        steps = self.image_history.recipe()
+        if not steps:
+            messagebox.showinfo("Save Edit Recipe", "There are no edits that can be applied to other pictures yet.")
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Save Edit Recipe",
+            defaultextension=".json",
+            filetypes=(("Edit Recipe", "*.json"), ("All files", "*.*"))
+        )
+        if filepath:
+            from edits import saverecipe
+            saverecipe(filepath, steps)
 
     def save_image(self):
         filepath = filedialog.asksaveasfilename(
@@ -933,10 +1131,48 @@ class EditorFrame(ctk.CTkFrame):
                     save_params['quality'] = 95
                     print("Saving as JPEG with default quality (95)")
             
-            self.current_image.save(filepath, **save_params)
+            steps = self.image_history.operations()
+            if not self.is_proxy:
+                self.current_image.save(filepath, **save_params)
+            elif None in steps:
+                if messagebox.askyesno(
+                    "Save Image",
+                    "Some edits can't be redone on the full-resolution picture.\n"
+                    "Save the preview resolution image instead?"
+                ):
+                    self.current_image.save(filepath, **save_params)
+            else:
+                self.export_full_resolution(steps, filepath, save_params)
             # Invalidate the quality after any save
             self.last_jpeg_quality = None
 
+    def export_full_resolution(self, steps, filepath, save_params):
+        """Redo the edits on the full picture in the background and save it."""
+        def done(size):
+            self.save_button.configure(state="normal", text="Save Image")
+            print(f"✓ Saved {size[0]}x{size[1]} image to {filepath}")
+
+        def failed(error):
+            self.save_button.configure(state="normal", text="Save Image")
+            messagebox.showerror("Save Error", f"Saving the full-resolution image failed:\n{error}")
+
+        self.save_button.configure(state="disabled", text="Saving...")
+        self.jobs.submit(
+            "export", self.export_image, self.current_image_path, steps, filepath, save_params,
+            on_done=done, on_error=failed,
+        )
+
+    def export_image(self, job, source_path, steps, filepath, save_params):
+        """Worker side of the full-resolution save; must not touch any widget."""
+        from edits import replay
+
+        image = Image.open(source_path)
+        image.load()
+        image = replay(image, steps, progress=job.progress)
+        job.check()
+        image.save(filepath, **save_params)
+        return image.size
+
 
 class AnalysisOptionsWindow(ctk.CTkToplevel):
     def __init__(self, master):
@@ -965,27 +1201,31 @@ class AnalysisOptionsWindow(ctk.CTkToplevel):
         self.after(20, self.grab_set)
 
     def start_analysis(self, target_size_kb):
-        for btn in self.buttons:
-            btn.configure(state="disabled")
-        self.progress_bar.pack(pady=10, padx=20, fill="x")
-        self.progress_bar.start()
-        
-        self.master.run_analysis_thread([target_size_kb])
-        self.destroy()
+        self._run([target_size_kb])
 
     def run_all_analysis(self):
+        targets_kb = [30, 100, 500, 1024]
+        self._run(targets_kb)
+
+    def _run(self, targets_kb):
         for btn in self.buttons:
             btn.configure(state="disabled")
+        self.progress_bar.configure(mode='determinate')
+        self.progress_bar.set(0)
         self.progress_bar.pack(pady=10, padx=20, fill="x")
-        self.progress_bar.start()
 
-        targets_kb = [30, 100, 500, 1024]
-        self.master.run_analysis_thread(targets_kb)
+        # The window stays open with the progress until the analysis ends;
+        # closing it cancels the analysis
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.master.run_analysis_job(targets_kb, on_progress=self.progress_bar.set, on_finish=self.destroy)
+
+    def cancel(self):
+        self.master.jobs.cancel("analysis")
         self.destroy()
 
 
 class AnalysisReportWindow(ctk.CTkToplevel):
-    def __init__(self, master, results):
+    def __init__(self, master, results, curve=None):
         super().__init__(master)
         self.title("Analysis Report")
         self.geometry("850x700")
@@ -996,48 +1236,28 @@ class AnalysisReportWindow(ctk.CTkToplevel):
 
         self.plot_label = ctk.CTkLabel(self, text="")
         self.plot_label.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-        self.generate_and_display_plot(results)
+        self.generate_and_display_plot(results, curve)
 
         self.textbox = ctk.CTkTextbox(self, wrap="word")
         self.textbox.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
-        self.generate_report_text(results)
+        self.generate_report_text(results, curve)
         self.textbox.configure(state="disabled")
 
         self.after(20, self.grab_set)
 
-    def generate_and_display_plot(self, results):
-        sizes = [r['actual_kb'] for r in results]
-        psnr_vals = [r['psnr'] for r in results]
+    def generate_and_display_plot(self, results, curve=None):
+        from compression import plotcurve
 
-        plt.style.use('dark_background')
-        fig, ax = plt.subplots(figsize=(8, 4))
-        
-        ax.plot(sizes, psnr_vals, 'w-o', label='PSNR')
-        ax.set_xlabel("File Size (KB)")
-        ax.set_ylabel("PSNR (dB)")
-        ax.set_title("Rate-Distortion Curve")
-        ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-        ax.legend()
-        
-        if len(sizes) > 2:
-            slopes = [(psnr_vals[i+1] - psnr_vals[i]) / (sizes[i+1] - sizes[i]) for i in range(len(sizes)-1)]
-            if slopes:
-                optimal_index = np.argmax(np.diff(slopes)) + 1 if len(slopes) > 1 else 0
-                ax.plot(sizes[optimal_index], psnr_vals[optimal_index], 'r*', markersize=15, label='Optimal Point')
-                ax.legend()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        plot_image = Image.open(buf)
+        plot_image = Image.open(io.BytesIO(plotcurve(results, curve)))
         
         ctk_plot = ctk.CTkImage(light_image=plot_image, dark_image=plot_image, size=plot_image.size)
         self.plot_label.configure(image=ctk_plot)
-        plt.close(fig)
 
-    def generate_report_text(self, results):
+    def generate_report_text(self, results, curve=None):
         report = "Compression & Rate-Distortion Analysis\n"
         report += "=" * 40 + "\n\n"
+        if curve:
+            report += f"Quality search used {len(curve)} full-size encodes.\n\n"
 
         report += f"{ 'Target Size':<15}{'Actual Size':<15}{'Quality':<10}{'PSNR (dB)':<15}{'SSIM':<10}{'MSE':<10}\n"
         report += "-" * 75 + "\n"
@@ -1069,5 +1289,17 @@ class AnalysisReportWindow(ctk.CTkToplevel):
         self.textbox.insert("0.0", report)
 
 
+def main():
+    parser = argparse.ArgumentParser(description="PyImgScan GUI")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and initialization times of each startup phase")
+    parser.add_argument("--full-resolution", action="store_true",
+                        help="edit large pictures at full resolution instead of a preview proxy")
+    args = parser.parse_args()
+
+    startup.enabled = args.profile_startup
+    App(proxy_editing=not args.full_resolution)
+
+
 if __name__ == "__main__":
-    App()
\ No newline at end of file
+    main()
\ No newline at end of file
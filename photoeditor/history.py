@@ -0,0 +1,191 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# memory the stored states may use before packed ones are spilled to disk
+DEFAULT_RAM_BUDGET = 1024 * 1024 * 1024
+
+# number of most recent states kept as raw images for instant undo
+KEEP_RECENT = 2
+
+# modes PNG can store; others (CMYK, float) are packed as deflated TIFF
+PNG_MODES = ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16")
+
+
+def _nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class _State:
+    """
+    ONE STORED IMAGE: RAW (image), PACKED IN RAM (data) OR SPILLED (path)
+    """
+
+    __slots__ = ("image", "data", "path")
+
+    def __init__(self, image):
+        self.image = image
+        self.data = None
+        self.path = None
+
+    def nbytes(self):
+        if self.image is not None:
+            return _nbytes(self.image)
+        if self.data is not None:
+            return len(self.data)
+        return 0
+
+
+class HistoryStore:
+    """
+    LIST-LIKE STACK OF IMAGES WITH A BOUNDED MEMORY FOOTPRINT
+    - supports append(), pop(), [index], len() and clear() like the plain
+      list of images it replaces;
+    - the first state (the original, unless "pin_first" is off) and the
+      KEEP_RECENT most recent states stay in memory as images;
+    - older states are packed losslessly (PNG) on a background thread, and
+      the oldest packed states are written to a temporary directory when
+      the store grows past "ram_budget";
+    - packed and spilled states are decoded again when they are read
+    """
+
+    def __init__(self, ram_budget=DEFAULT_RAM_BUDGET, keep_recent=KEEP_RECENT, pin_first=True):
+        self.ram_budget = ram_budget
+        self.keep_recent = keep_recent
+        self.pin_first = pin_first
+        self._states = []
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._dir = None
+        self._finalizer = None
+
+    def __len__(self):
+        return len(self._states)
+
+    def __getitem__(self, index):
+        with self._lock:
+            index = range(len(self._states))[index]
+            return self._load(self._states[index], keep=self._pinned(index))
+
+    def append(self, image):
+        with self._lock:
+            self._states.append(_State(image))
+        self._pool.submit(self._compact)
+
+    def pop(self):
+        with self._lock:
+            state = self._states.pop()
+            image = self._load(state, keep=False)
+            self._discard(state)
+        # the state below may have to come back in as a recent one
+        self._pool.submit(self._compact)
+        return image
+
+    def clear(self):
+        with self._lock:
+            for state in self._states:
+                self._discard(state)
+            self._states = []
+
+    def nbytes(self):
+        """
+        MEMORY USED BY THE STORED STATES (RAW AND PACKED), IN BYTES
+        """
+
+        with self._lock:
+            return sum(state.nbytes() for state in self._states)
+
+    def _pinned(self, index):
+        return (self.pin_first and index == 0) or index >= len(self._states) - self.keep_recent
+
+    def _load(self, state, keep):
+        # decode a packed or spilled state; "keep" holds on to the decoded
+        # image, for states that are pinned in memory
+        if state.image is not None:
+            return state.image
+
+        if state.data is not None:
+            image = Image.open(io.BytesIO(state.data))
+        else:
+            image = Image.open(state.path)
+        image.load()
+
+        if keep:
+            self._discard(state)
+            state.image = image
+        return image
+
+    def _discard(self, state):
+        if state.path is not None:
+            try:
+                os.remove(state.path)
+            except OSError:
+                pass
+        state.image = state.data = state.path = None
+
+    def _compact(self):
+        # pack every state that is no longer pinned, one at a time and
+        # without holding the lock while encoding
+        while True:
+            with self._lock:
+                # pinned states that were packed before become recent again
+                for index, state in enumerate(self._states):
+                    if self._pinned(index) and state.image is None:
+                        self._load(state, keep=True)
+                candidates = [
+                    state for index, state in enumerate(self._states)
+                    if not self._pinned(index) and state.image is not None
+                ]
+                if not candidates:
+                    break
+                state = candidates[0]
+                image = state.image
+
+            buffer = io.BytesIO()
+            if image.mode in PNG_MODES:
+                image.save(buffer, "PNG", compress_level=1)
+            else:
+                image.save(buffer, "TIFF", compression="tiff_adobe_deflate")
+
+            with self._lock:
+                # the state may have been popped or loaded again meanwhile
+                if state.image is image and state in self._states:
+                    state.image = None
+                    state.data = buffer.getvalue()
+
+        self._spill()
+
+    def _spill(self):
+        # write packed states to disk, oldest first, until the store fits
+        with self._lock:
+            total = sum(state.nbytes() for state in self._states)
+            for state in self._states:
+                if total <= self.ram_budget:
+                    break
+                if state.data is None:
+                    continue
+                if self._dir is None:
+                    self._dir = tempfile.mkdtemp(prefix="photoeditor-history-")
+                    self._finalizer = weakref.finalize(self, shutil.rmtree, self._dir, True)
+                fd, path = tempfile.mkstemp(dir=self._dir, suffix=".state")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(state.data)
+                total -= len(state.data)
+                state.data = None
+                state.path = path
+
+    def close(self):
+        """
+        DROP ALL STATES AND REMOVE THE SPILL DIRECTORY
+        """
+
+        self.clear()
+        self._pool.shutdown(wait=True)
+        if self._finalizer is not None:
+            self._finalizer()
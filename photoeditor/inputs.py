@@ -0,0 +1,86 @@
+import os
+import sys
+import glob
+
+# file extensions picked up when a directory is given in batch mode
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def collectinputs(sources):
+    """
+    EXPAND DIRECTORIES, GLOB PATTERNS AND FILES INTO (path, relative path) PAIRS
+    - the relative path is used to mirror the input layout in the output tree;
+    - directories are walked recursively for known image extensions;
+    - with more than one source, paths under a directory or glob pattern are
+      prefixed with its name, so that "d1/" and "d2/" keep apart
+    """
+
+    found = []
+    seen = set()
+    prefixed = len(sources) > 1
+
+    def add(path, rel):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            found.append((path, rel))
+
+    for source in sources:
+        if os.path.isdir(source):
+            prefix = sourcename(source) if prefixed else ""
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        add(path, os.path.join(prefix, os.path.relpath(path, source)))
+        elif glob.has_magic(source):
+            # the fixed leading part of the pattern is the root of the mirror
+            base = source
+            while glob.has_magic(base):
+                base = os.path.dirname(base)
+            prefix = sourcename(base or ".") if prefixed else ""
+            for path in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(path):
+                    add(path, os.path.join(prefix, os.path.relpath(path, base or ".")))
+        elif os.path.isfile(source):
+            add(source, os.path.basename(source))
+        else:
+            print(f"Skipping '{source}': no such file or directory", file=sys.stderr)
+
+    return found
+
+
+def sourcename(path):
+    """
+    LAST COMPONENT OF A DIRECTORY PATH, ALSO FOR "dir/" AND "."
+    """
+
+    return os.path.basename(os.path.abspath(path))
+
+
+def mirrorpaths(inputs, output_dir, ext):
+    """
+    OUTPUT PATH OF EVERY (path, relative path) PAIR FROM collectinputs()
+    - the relative path is kept under "output_dir" with its extension
+      replaced by "ext";
+    - inputs that would share an output file ("a.jpg" and "a.png", or two
+      loose files of the same name) get a numbered suffix ("a-2.png"), with a
+      warning, instead of overwriting each other;
+    - returns a list of (path, output path) pairs in input order
+    """
+
+    pairs = []
+    taken = set()
+    for path, rel in inputs:
+        stem = os.path.join(output_dir, os.path.splitext(rel)[0])
+        out_path = stem + ext
+        count = 1
+        while os.path.normcase(out_path) in taken:
+            count += 1
+            out_path = f"{stem}-{count}{ext}"
+        if count > 1:
+            print(f"'{path}' would overwrite another output, writing '{out_path}'", file=sys.stderr)
+        taken.add(os.path.normcase(out_path))
+        pairs.append((path, out_path))
+    return pairs
@@ -0,0 +1,154 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# background jobs that may run at once; further jobs wait for a free worker
+MAX_WORKERS = 2
+
+# how often the Tk loop checks for finished jobs and progress, in ms
+POLL_MS = 50
+
+
+class Cancelled(Exception):
+    """
+    RAISED INSIDE A JOB AT ITS NEXT CHECKPOINT AFTER IT WAS CANCELLED
+    """
+
+
+class Job:
+    """
+    HANDLE OF ONE BACKGROUND JOB, SHARED BY THE WORKER AND THE UI
+    - the worker calls progress(fraction) (or check()) now and then; both
+      raise Cancelled once the job was cancelled, which is how cancellation
+      reaches code that can't be interrupted from outside;
+    - the UI only sees the results through the scheduler's callbacks
+    """
+
+    def __init__(self, key, on_done=None, on_error=None, on_progress=None):
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.future = None
+        self._cancelled = threading.Event()
+        self._fraction = None
+        self._reported = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def check(self):
+        """
+        CANCELLATION CHECKPOINT FOR THE WORKER
+        """
+
+        if self._cancelled.is_set():
+            raise Cancelled(self.key)
+
+    def progress(self, fraction):
+        """
+        REPORT PROGRESS (0.0 - 1.0) FROM THE WORKER; ALSO A CHECKPOINT
+        """
+
+        self._fraction = fraction
+        self.check()
+
+
+class JobScheduler:
+    """
+    RUN HEAVY OPERATIONS OFF THE TK THREAD AND HAND THE RESULTS BACK TO IT
+    - jobs run on a bounded thread pool; the image libraries release the GIL
+      for their heavy work, so the Tk loop stays responsive;
+    - the scheduler polls its jobs with after() and calls on_done(result),
+      on_error(exception) and on_progress(fraction) on the Tk thread, so
+      those callbacks may touch widgets;
+    - jobs have a key; submitting a job cancels the running job with the
+      same key, and results of cancelled jobs are dropped
+    """
+
+    def __init__(self, widget, workers=MAX_WORKERS, poll_ms=POLL_MS):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._jobs = {}
+        self._polling = None
+
+    def submit(self, key, func, *args, on_done=None, on_error=None, on_progress=None):
+        """
+        RUN func(job, *args) IN THE BACKGROUND AND RETURN ITS Job
+        """
+
+        self.cancel(key)
+        job = Job(key, on_done, on_error, on_progress)
+        job.future = self._pool.submit(func, job, *args)
+        self._jobs[key] = job
+        if self._polling is None:
+            self._polling = self.widget.after(self.poll_ms, self._poll)
+        return job
+
+    def cancel(self, key):
+        """
+        CANCEL THE JOB WITH "key", IF ONE IS RUNNING
+        """
+
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+    def running(self, key):
+        return key in self._jobs
+
+    def _poll(self):
+        self._polling = None
+        for key, job in list(self._jobs.items()):
+            if job.on_progress is not None and job._fraction != job._reported:
+                job._reported = job._fraction
+                self._deliver(job.on_progress, job._fraction)
+
+            if not job.future.done():
+                continue
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+            # an earlier callback may have cancelled or replaced this job
+            if job.cancelled:
+                continue
+            error = job.future.exception()
+            if isinstance(error, Cancelled):
+                continue
+            if error is not None:
+                self._deliver(job.on_error, error)
+            else:
+                self._deliver(job.on_done, job.future.result())
+
+        # a callback may have submitted a job, which already polls again
+        if self._jobs and self._polling is None:
+            self._polling = self.widget.after(self.poll_ms, self._poll)
+
+    @staticmethod
+    def _deliver(callback, value):
+        # a failing callback is reported, but must not stop the polling
+        # that delivers every other job's results
+        if callback is None:
+            return
+        try:
+            callback(value)
+        except Exception:
+            traceback.print_exc()
+
+    def shutdown(self):
+        """
+        CANCEL EVERYTHING AND STOP THE WORKERS (WITHOUT WAITING FOR THEM)
+        """
+
+        for key in list(self._jobs):
+            self.cancel(key)
+        if self._polling is not None:
+            self.widget.after_cancel(self._polling)
+            self._polling = None
+        self._pool.shutdown(wait=False)
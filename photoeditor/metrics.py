@@ -0,0 +1,181 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# SSIM constants and window as used by skimage.metrics.structural_similarity
+# with its defaults (uniform 7x7 window, sample covariance)
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_WINDOW = 7
+
+# image rows per SSIM tile; every tile is filtered on its own thread
+TILE_ROWS = 256
+
+# variances are computed around this value, which keeps the squares small
+# enough for float32 to hold them without losing the difference
+_OFFSET = 128.0
+
+
+def _asarray(image):
+    array = np.asarray(image)
+    if array.dtype != np.uint8:
+        raise ValueError(f"Expected an 8-bit image, got {array.dtype}")
+    return array
+
+
+def _luminance(array):
+    # ITU-R BT.601 luma, like PIL's convert("L") but without rounding
+    if array.ndim == 2:
+        return array.astype(np.float32)
+    return array[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], np.float32)
+
+
+class Reference:
+    """
+    QUALITY METRICS OF MANY CANDIDATES AGAINST ONE REFERENCE IMAGE
+    - the reference is converted to float32 once and its SSIM moments (local
+      means and variances) are computed once and reused for every candidate;
+    - MSE and PSNR come from a single squared-error pass over the uint8 data;
+    - SSIM matches skimage's structural_similarity(win_size=7,
+      data_range=255, channel_axis=-1) to within 1e-6, and is computed in
+      bands of TILE_ROWS rows on a thread pool;
+    - "luminance" computes SSIM on the luma channel only, and "downscale"
+      on both images reduced by that factor (INTER_AREA); both are faster
+      approximations that no longer match skimage
+    """
+
+    def __init__(self, image, luminance=False, downscale=1, tile_rows=TILE_ROWS, workers=None):
+        self.array = _asarray(image)
+        self.luminance = luminance
+        self.downscale = downscale
+        self.tile_rows = tile_rows
+        self.workers = workers or os.cpu_count() or 1
+
+        self._x = self._ssiminput(self.array)
+        h, w = self._x.shape[:2]
+        self.win_size = min(SSIM_WINDOW, h, w)
+        if self.win_size % 2 == 0:
+            self.win_size -= 1
+
+        # moments of the reference, reused by every ssim() call
+        if self.win_size >= 3:
+            self._ux, self._vx = self._moments(self._x)
+
+    def _ssiminput(self, array):
+        if self.downscale > 1:
+            h, w = array.shape[:2]
+            size = (max(1, round(w / self.downscale)), max(1, round(h / self.downscale)))
+            array = cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+        if self.luminance:
+            return _luminance(array)
+        return array.astype(np.float32)
+
+    def _filter(self, array):
+        return cv2.boxFilter(array, -1, (self.win_size, self.win_size), borderType=cv2.BORDER_REFLECT)
+
+    def _moments(self, x):
+        # local mean and (sample) variance of the whole image
+        np_ = self.win_size ** 2
+        xc = x - _OFFSET
+        ux = self._filter(xc)
+        vx = self._filter(xc * xc)
+        vx -= ux * ux
+        vx *= np_ / (np_ - 1.0)
+        ux += _OFFSET
+        return ux, vx
+
+    def sse(self, candidate):
+        """
+        SUM OF SQUARED ERRORS AGAINST THE REFERENCE
+        """
+
+        candidate = _asarray(candidate)
+        if candidate.shape != self.array.shape:
+            raise ValueError(f"Shape mismatch: {candidate.shape} vs {self.array.shape}")
+        return cv2.norm(self.array, candidate, cv2.NORM_L2SQR)
+
+    def mse(self, candidate):
+        return self.sse(candidate) / self.array.size
+
+    @staticmethod
+    def psnrfrom(mse, data_range=255.0):
+        """
+        PSNR IN dB FOR A GIVEN MSE (INFINITE FOR IDENTICAL IMAGES)
+        """
+
+        if mse == 0:
+            return float("inf")
+        return float(10 * np.log10(data_range ** 2 / mse))
+
+    def psnr(self, candidate):
+        return self.psnrfrom(self.mse(candidate))
+
+    def ssim(self, candidate):
+        """
+        MEAN STRUCTURAL SIMILARITY AGAINST THE REFERENCE
+        - 0.0 for images smaller than 3 pixels, as in the editor before
+        """
+
+        if self.win_size < 3:
+            return 0.0
+
+        y = self._ssiminput(_asarray(candidate))
+        if y.shape != self._x.shape:
+            raise ValueError(f"Shape mismatch: {y.shape} vs {self._x.shape}")
+
+        h = y.shape[0]
+        pad = (self.win_size - 1) // 2
+        bands = [(top, min(top + self.tile_rows, h)) for top in range(0, h, self.tile_rows)]
+
+        if len(bands) == 1 or self.workers == 1:
+            sums = [self._ssimband(y, top, bottom) for top, bottom in bands]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                sums = list(pool.map(lambda band: self._ssimband(y, *band), bands))
+
+        # skimage ignores a strip of the window radius along the border
+        count = (h - 2 * pad) * (y.shape[1] - 2 * pad) * (y.shape[2] if y.ndim == 3 else 1)
+        return float(sum(sums) / count)
+
+    def _ssimband(self, y, top, bottom):
+        # SSIM map of rows top..bottom, summed over the rows and columns that
+        # count; the band is filtered together with "pad" rows of context on
+        # both sides so its windows see the same pixels as on the whole image
+        h, w = y.shape[:2]
+        pad = (self.win_size - 1) // 2
+        lo, hi = max(0, top - pad), min(h, bottom + pad)
+
+        np_ = self.win_size ** 2
+        x = self._x[lo:hi]
+        yc = y[lo:hi] - _OFFSET
+        uy = self._filter(yc)
+        vy = self._filter(yc * yc)
+        vy -= uy * uy
+        vy *= np_ / (np_ - 1.0)
+        vxy = self._filter((x - _OFFSET) * yc)
+        ux = self._ux[lo:hi]
+        vxy -= (ux - _OFFSET) * uy
+        vxy *= np_ / (np_ - 1.0)
+        uy += _OFFSET
+        vx = self._vx[lo:hi]
+
+        c1 = (SSIM_K1 * 255) ** 2
+        c2 = (SSIM_K2 * 255) ** 2
+        s = (2 * ux * uy + c1) * (2 * vxy + c2)
+        s /= (ux * ux + uy * uy + c1) * (vx + vy + c2)
+
+        # rows of this band that are inside the counted area
+        first, last = max(top, pad), min(bottom, h - pad)
+        if first >= last:
+            return 0.0
+        return s[first - lo:last - lo, pad:w - pad].sum(dtype=np.float64)
+
+    def measure(self, candidate):
+        """
+        {"psnr", "ssim", "mse"} OF A CANDIDATE
+        """
+
+        mse = self.mse(candidate)
+        return {"psnr": self.psnrfrom(mse), "ssim": self.ssim(candidate), "mse": mse}
@@ -1,31 +1,61 @@
-import cv2
+import io
+import os
+import sys
+import json
+import time
+import base64
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+from PIL import Image
 
 from cvtools import resize
-from cvtools import perspective_transform
-from cvtools import getoutlines
-from cvtools import simple_erode
+from cvtools import order_points
 from cvtools import simple_dilate
 from cvtools import brightness_contrast
-from cvtools import blank
 
-# PARSE COMMAND-LINE ARGUMENTS WITH ARGPARSE
-ap = argparse.ArgumentParser()
-ap.add_argument(
-    "-i", "--image", required=True, help="Path to the image to be corrected."
+from detectors import cascade, DETECTORS, CONFIDENCE_THRESHOLD, MIN_CONFIDENCE
+from scancache import ScanCache, DEFAULT_CACHE_DIR
+from inputs import collectinputs, mirrorpaths
+
+# corner detection parameters: height of the detection image, gaussian blur
+# kernel, Canny thresholds and the brightness/contrast adjustment
+DETECT_HEIGHT = 500
+BLUR_KERNEL = (11, 11)
+CANNY_THRESHOLDS = (60, 245)
+CONTRAST = (1.56, -60)
+
+# everything that changes the detected corners, part of the cache key; bump
+# "version" whenever the detection algorithms change
+DETECTION_PARAMS = {
+    "version": 1,
+    "height": DETECT_HEIGHT,
+    "blur": BLUR_KERNEL,
+    "canny": CANNY_THRESHOLDS,
+    "contrast": CONTRAST,
+    "detectors": sorted(DETECTORS),
+    "threshold": CONFIDENCE_THRESHOLD,
+    "floor": MIN_CONFIDENCE,
+}
+
+# JPEG DCT-domain scaling factors, largest reduction first
+REDUCED_READ_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
 )
-args = vars(ap.parse_args())
 
-# READ INPUT IMAGE
-img = cv2.imread(args["image"])
+# brightness_contrast(img, *CONTRAST) as a lookup table, so it can be applied
+# to the warped output in place (same saturating mapping as convertScaleAbs)
+CONTRAST_LUT = cv2.convertScaleAbs(
+    np.arange(256, dtype=np.uint8), alpha=CONTRAST[0], beta=CONTRAST[1]
+)
 
-# if input image is empty, notify the user and quit program
-if img is None:
-    print()
-    print("The file does not exist or is empty!")
-    print("Please select a valid image file!")
-    print()
-    exit(0)  # exit code zero means a clean exit with no output/errors etc.
+# per-process output buffer and result cache used in batch and manifest mode
+_buffer = None
+_cache = None
 
 
 """
@@ -36,132 +66,649 @@ Primary Functions
 def preprocess(img):
     """
     BAISC PRE-PROCESSING TO OBTAIN A CANNY EDGE IMAGE
+    - only the 500px copy is adjusted, the input image is left untouched;
+    - returns the adjusted 500px image, its scale factor and the edge image
     """
 
-    # increase contrast between paper and background
-    img_adj = brightness_contrast(img, 1.56, -60)
-
     # calculate the ratio of the image to the new height (500px) so we
     # can scale the manipulated image back to the original size later
-    scale = img_adj.shape[0] / 500.0
+    scale = img.shape[0] / float(DETECT_HEIGHT)
 
     # scale the image down to 500px in height;
-    img_scaled = resize(img_adj, height=500)
+    img_scaled = resize(img, height=DETECT_HEIGHT)
+
+    # increase contrast between paper and background
+    img_adj = brightness_contrast(img_scaled, *CONTRAST)
 
     # convert image to grayscale
-    img_gray = cv2.cvtColor(img_scaled, cv2.COLOR_BGR2GRAY)
+    img_gray = cv2.cvtColor(img_adj, cv2.COLOR_BGR2GRAY)
 
     # apply gaussian blur with a 11x11 kernel
-    img_gray = cv2.GaussianBlur(img_gray, (11, 11), 0)
+    img_gray = cv2.GaussianBlur(img_gray, BLUR_KERNEL, 0)
 
     # apply canny edge detection
-    img_edge = cv2.Canny(img_gray, 60, 245)
+    img_edge = cv2.Canny(img_gray, *CANNY_THRESHOLDS)
 
     # dilate the edge image to connect any small gaps
     img_edge = simple_dilate(img_edge)
 
-    return img_adj, scale, img_scaled, img_edge
+    return img_adj, scale, img_edge
+
+
+class OutputBuffer:
+    """
+    GROWABLE BUFFER THAT CORRECTED IMAGES ARE WRITTEN INTO
+    - "take" returns a contiguous array view of the requested shape, only
+      reallocating when a larger image than any before comes along;
+    - the view is overwritten by the next "take", so write it out first
+    """
+
+    def __init__(self):
+        self.data = np.empty(0, np.uint8)
+
+    def take(self, shape):
+        size = int(np.prod(shape))
+        if size > self.data.size:
+            self.data = np.empty(size, np.uint8)
+        return self.data[:size].reshape(shape)
+
+
+def rectify(img, corners, out=None):
+    """
+    FUSED PERSPECTIVE TRANSFORM + BRIGHTNESS/CONTRAST ADJUSTMENT
+    - same geometry as cvtools.perspective_transform, followed by the contrast
+      increase of brightness_contrast(img, *CONTRAST);
+    - the input is read once by the warp and the contrast is mapped in place
+      on the output, so no adjusted full-size copy of the input is made;
+    - if an OutputBuffer is given as "out", the result is written into it
+    """
+
+    # order the corners and measure the straightened document, exactly like
+    # perspective_transform does
+    corners_old = order_points(corners)
+    (tl, tr, br, bl) = corners_old
+    maxW = max(int(np.hypot(*(br - bl))), int(np.hypot(*(tr - tl))))
+    maxH = max(int(np.hypot(*(tr - br))), int(np.hypot(*(tl - bl))))
+    corners_corrected = np.array(
+        [[0, 0], [maxW - 1, 0], [maxW - 1, maxH - 1], [0, maxH - 1]], dtype="float32"
+    )
+    matrix = cv2.getPerspectiveTransform(corners_old, corners_corrected)
+
+    shape = (maxH, maxW) + img.shape[2:]
+    img_corrected = out.take(shape) if out is not None else np.empty(shape, np.uint8)
+
+    # warp straight into the output, then map its intensities in place
+    cv2.warpPerspective(img, matrix, (maxW, maxH), dst=img_corrected)
+    cv2.LUT(img_corrected, CONTRAST_LUT, dst=img_corrected)
+
+    return img_corrected
+
+
+"""
+Decoding
+"""
+
+
+def readimage(source, flags=cv2.IMREAD_COLOR):
+    """
+    DECODE AN IMAGE FROM A FILE PATH OR A BUFFER OF ENCODED BYTES
+    """
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), flags)
+    return cv2.imread(source, flags)
+
+
+def readreduced(source, min_size=DETECT_HEIGHT):
+    """
+    DECODE A REDUCED-SIZE COPY OF AN IMAGE FOR CORNER FINDING
+    - JPEGs are decoded with DCT scaling (1/2, 1/4 or 1/8) so the full-size
+      pixels are never produced; the largest reduction that keeps the short
+      side at least "min_size" px is used;
+    - other formats (and JPEGs that are already small) are decoded at full
+      size;
+    - returns the image and the (height, width) of the full-size image, or
+      None, None if the image cannot be decoded
+    """
+
+    # only the header is parsed here, no pixels are decoded
+    try:
+        stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        with Image.open(stream) as header:
+            fmt = header.format
+            width, height = header.size
+    except Exception:
+        fmt, width, height = None, 0, 0
+
+    if fmt == "JPEG":
+        for factor, flag in REDUCED_READ_FLAGS:
+            if min(width, height) // factor >= min_size:
+                img = readimage(source, flag)
+                if img is None:
+                    return None, None
+                # the decoder applies the EXIF orientation, which may swap the
+                # sides compared to the header
+                if (img.shape[0] >= img.shape[1]) != (height >= width):
+                    width, height = height, width
+                return img, (height, width)
+
+    img = readimage(source)
+    if img is None:
+        return None, None
+    return img, img.shape[:2]
+
+
+"""
+Full Pipeline
+"""
+
+
+def findcorners(img, full_shape=None, timings=None, info=None):
+    """
+    PRE-PROCESSING + DETECTOR CASCADE
+    - corners are found on "img", which may be a reduced-size decode of an
+      image of "full_shape" (height, width); defaults to the shape of "img";
+    - returns the corners scaled to the full-size image (None if no document
+      was found) and the scale factor from the 500px detection image;
+    - corners are found by the detector cascade (see detectors.py), which
+      only escalates to the expensive detectors when confidence is low;
+    - if a "timings" dict is given, the seconds spent in each stage are
+      recorded in it; if an "info" dict is given, the detector used and its
+      confidence are recorded in it
+    """
+
+    if timings is None:
+        timings = {}
+    tick = time.perf_counter()
+
+    # obtain the adjusted 500px image along with its scale factor, and the
+    # Canny edge image
+    img_adj, scale, img_edge = preprocess(img)
+    now = time.perf_counter()
+    timings["preprocess"] = now - tick
+    tick = now
+
+    # obtain 4 corner points, starting with the vectorized candidate engine and
+    # escalating to the slower detectors if that is unconvincing
+    detection = cascade(img_adj, img_edge)
+    timings["detect"] = time.perf_counter() - tick
+
+    # account for the detection image being smaller than the full image
+    full_h, full_w = full_shape[:2] if full_shape is not None else img.shape[:2]
+    ratio_x = full_w / img.shape[1]
+    ratio_y = full_h / img.shape[0]
+    if detection is None:
+        return None, scale * ratio_y
+
+    if info is not None:
+        info["detector"] = detection.detector
+        info["confidence"] = detection.confidence
+
+    # scale the corner points back to the original size of the image using the
+    # scale calculated previously
+    corners = detection.corners.reshape(4, 2) * scale * (ratio_x, ratio_y)
+    return corners, scale * ratio_y
 
 
-def gethull(img_edge):
+def scan(img, timings=None, img_full=None, out=None, info=None, full_shape=None):
     """
-    1st ROUND OF OUTLINE FINDING, + CONVEX HULL
+    FULL PIPELINE: EDGES -> CORNERS -> PERSPECTIVE TRANSFORM
+    - corners are found on "img", which may be a reduced-size decode; only the
+      perspective transform touches "img_full", the full-resolution image (or
+      a function that decodes it, in which case "full_shape" must be given),
+      which defaults to "img";
+    - the brightness/contrast adjustment is fused with the warp (rectify) and
+      the result is written into "out" if an OutputBuffer is given;
+    - returns the corners (scaled to the full-resolution image), the scale
+      factor from the 500px detection image and the corrected image;
+    - corners and corrected image are None if no document was found;
+    - "timings" and "info" are filled in as by findcorners()
     """
 
-    # make a copy of the edge image because the following function manipulates
-    # the input
-    img_prehull = img_edge.copy()
+    if timings is None:
+        timings = {}
+    if img_full is None:
+        img_full = img
+    if full_shape is None:
+        full_shape = img_full.shape
 
-    # find outlines in the (newly copied) edge image
-    outlines = getoutlines(img_prehull)
+    corners, scale = findcorners(img, full_shape, timings, info)
+    if corners is None:
+        return None, scale, None
 
-    # create a blank image for convex hull operation
-    img_hull = blank(img_prehull.shape, img_prehull.dtype, "0")
+    # only decode the full-resolution pixels once a document has been found
+    if callable(img_full):
+        tick = time.perf_counter()
+        img_full = img_full()
+        timings["decode_full"] = time.perf_counter() - tick
 
-    # draw convex hulls (fit polygon) for all outlines detected to 'img_contour'
-    for outline in range(len(outlines)):
+    # finally correct the perspective of the image by applying four-point
+    # perspective transform, increasing the contrast in the same pass
+    tick = time.perf_counter()
+    img_corrected = rectify(img_full, corners, out)
+    timings["transform"] = time.perf_counter() - tick
 
-        hull = cv2.convexHull(outlines[outline])
+    return corners, scale, img_corrected
 
-        # parameters: source image, outlines (contours),
-        #             contour index (-1 for all), color, thickness
-        cv2.drawContours(img_hull, [hull], 0, 255, 3)
 
-    # erode the hull image to make the outline closer to paper
-    img_hull = simple_erode(img_hull)
+def scansource(source, timings=None, out=None, info=None, corners_only=False):
+    """
+    TWO-RESOLUTION SCAN OF A FILE PATH OR A BUFFER OF ENCODED BYTES
+    - corners are found on a reduced decode, the full image is only decoded
+      for the perspective transform, and not at all if "corners_only" is set
+      (the corrected image is None then);
+    - returns None if the image cannot be decoded, else the same as scan()
+    """
+
+    if timings is None:
+        timings = {}
+
+    tick = time.perf_counter()
+    img, full_shape = readreduced(source)
+    timings["decode"] = time.perf_counter() - tick
+    if img is None:
+        return None
+
+    if corners_only:
+        corners, scale = findcorners(img, full_shape, timings, info)
+        return corners, scale, None
+    if full_shape == img.shape[:2]:
+        return scan(img, timings, out=out, info=info)
+    return scan(img, timings, lambda: readimage(source), out, info, full_shape)
 
-    return img_hull
 
+def scancached(source, cache, timings=None, out=None, info=None, corners_only=False):
+    """
+    scansource() THROUGH A ScanCache
+    - a hit returns the cached corners without decoding anything when
+      "corners_only" is set, and the cached corrected image (as encoded PNG
+      bytes) if the cache stores images; otherwise only the full image is
+      decoded and rectified, skipping corner finding;
+    - on a miss the result is stored, with the corrected image encoded as PNG
+      bytes if the cache stores images, and the image array is returned;
+    - the third item returned is therefore either an image array, PNG bytes
+      (hits only) or None (see writeoutput); returns None if the image
+      cannot be read
+    """
 
-def getcorners(img_hull):
+    if timings is None:
+        timings = {}
+    if info is None:
+        info = {}
+
+    if not isinstance(source, (bytes, bytearray)):
+        try:
+            with open(source, "rb") as f:
+                source = f.read()
+        except OSError:
+            return None
+
+    key = cache.key(source, DETECTION_PARAMS)
+    record = cache.get(key)
+
+    if record is not None:
+        info.update(record["info"], cached=True)
+        scale = record["scale"]
+        if record["corners"] is None or corners_only:
+            corners = record["corners"] and np.array(record["corners"])
+            return corners, scale, None
+        corners = np.array(record["corners"])
+
+        image = cache.getimage(key) if cache.images else None
+        if image is not None:
+            return corners, scale, image
+
+        tick = time.perf_counter()
+        img_full = readimage(source)
+        timings["decode_full"] = time.perf_counter() - tick
+        if img_full is None:
+            return None
+        tick = time.perf_counter()
+        img_corrected = rectify(img_full, corners, out)
+        timings["transform"] = time.perf_counter() - tick
+        return corners, scale, img_corrected
+
+    result = scansource(source, timings, out, info, corners_only)
+    if result is None:
+        return None
+    corners, scale, img_corrected = result
+
+    record = {
+        "corners": None if corners is None else corners.tolist(),
+        "scale": scale,
+        "info": {k: info[k] for k in ("detector", "confidence") if k in info},
+    }
+    if img_corrected is not None and cache.images:
+        cache.put(key, record, cv2.imencode(".png", img_corrected)[1].tobytes())
+    else:
+        cache.put(key, record)
+
+    return corners, scale, img_corrected
+
+
+def writeoutput(path, img_corrected):
     """
-    2nd ROUND OF OUTLINE FINDING, + SORTING & APPROXIMATION
+    WRITE A CORRECTED IMAGE (ARRAY OR ALREADY ENCODED PNG BYTES) TO "path"
+    - PNG bytes are copied as they are into a .png file, and decoded and
+      encoded again in the format of any other extension
     """
 
-    # make a copy of the edge image because the following function manipulates
-    # the input
-    img_outlines = img_hull.copy()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if isinstance(img_corrected, (bytes, bytearray)):
+        if os.path.splitext(path)[1].lower() == ".png":
+            with open(path, "wb") as f:
+                f.write(img_corrected)
+            return True
+        img_corrected = cv2.imdecode(np.frombuffer(img_corrected, np.uint8), cv2.IMREAD_UNCHANGED)
+        if img_corrected is None:
+            return False
+    return cv2.imwrite(path, img_corrected)
+
+
+"""
+Batch Processing
+"""
+
+
+def _initworker(cache_args=None):
+    # every worker process handles one image at a time, so keep OpenCV from
+    # spawning its own thread pool on top of the process pool
+    cv2.setNumThreads(1)
+
+    # corrected images are written into the same buffer image after image,
+    # and every worker opens its own handle on the shared cache directory
+    global _buffer, _cache
+    _buffer = OutputBuffer()
+    _cache = ScanCache(*cache_args) if cache_args else None
+
+
+def _scan(source, timings=None, info=None, corners_only=False):
+    # scan with the worker's buffer, through the worker's cache if there is one
+    if _cache is not None:
+        return scancached(source, _cache, timings, _buffer, info, corners_only)
+    return scansource(source, timings, _buffer, info, corners_only)
+
+
+def scanfile(in_path, out_path):
+    """
+    READ, CORRECT AND WRITE A SINGLE IMAGE; RUNS INSIDE A WORKER PROCESS
+    - returns (status, seconds taken); never raises so one bad file does not
+      bring the whole batch down
+    """
 
-    # find outlines in the convex hull image
-    outlines = getoutlines(img_outlines)
+    start = time.perf_counter()
+    try:
+        result = _scan(in_path)
+        if result is None:
+            return "unreadable", time.perf_counter() - start
 
-    # sort the outlines by area from large to small, and only take the largest 4
-    # outlines in order to speed up the process and not waste time
-    outlines = sorted(outlines, key=cv2.contourArea, reverse=True)[:4]
+        corners, scale, img_corrected = result
+        if corners is None:
+            return "nocorners", time.perf_counter() - start
 
-    corners = None
-    # loop over outlines
-    for outline in outlines:
+        if not writeoutput(out_path, img_corrected):
+            return "writefail", time.perf_counter() - start
+    except Exception as e:
+        return f"error: {e}", time.perf_counter() - start
 
-        # find the perimeter of each outline for use in approximation
-        perimeter = cv2.arcLength(outline, True)
+    return "ok", time.perf_counter() - start
 
-        # > approximate a rough contour for each outline found, with (hopefully)
-        #   4 points (rectangular sheet of paper); [Douglas-Peuker Algorithm]
-        # > FIRST OPTION is the input outline;
-        # > SECOND OPTION is the accuracy of approximation (epsilon), here it
-        #   is set to a percentage of the perimeter of the outline
-        # > THIRD OPTION is whether to assume an outline
-        #   is closed, which in this case is yes (sheet of paper)
-        approx = cv2.approxPolyDP(outline, 0.02 * perimeter, True)
 
-        # if the approximation has 4 points, then assume it is correct, and
-        # assign these points to the 'corners' variable
-        if len(approx) == 4:
-            corners = approx
-            break
+def runbatch(inputs, output_dir, workers=None, cache_args=None):
+    """
+    CORRECT MANY IMAGES ACROSS A PROCESS POOL, MIRRORING THE INPUT TREE
+    - prints one status line per file along with the running throughput;
+    - "cache_args" are the ScanCache arguments the workers open, if any;
+    - returns the number of files that could not be corrected
+    """
 
-    return corners
+    total = len(inputs)
+    failed = 0
+    done = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_initworker, initargs=(cache_args,)
+    ) as pool:
+        futures = {}
+        for in_path, out_path in mirrorpaths(inputs, output_dir, ".png"):
+            futures[pool.submit(scanfile, in_path, out_path)] = (in_path, out_path)
+
+        for future in as_completed(futures):
+            in_path, out_path = futures[future]
+            status, elapsed = future.result()
+            done += 1
+            if status != "ok":
+                failed += 1
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(
+                f"[{done}/{total}] {status:<10} {in_path} -> {out_path} "
+                f"({elapsed:.2f}s, {rate:.1f} img/s)"
+            )
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Corrected {total - failed}/{total} images in {elapsed:.1f}s "
+        f"({total / max(elapsed, 1e-9):.1f} img/s)"
+    )
+    return failed
 
 
 """
-Main Proccess of the Program
+Manifest (Streaming) Processing
 """
 
-# obtain the adjusted image, scaled image along with its scale factor, and the
-# Canny edge image
-img_adj, scale, img_scaled, img_edge = preprocess(img)
 
-# perform convex hull on edge image to prevent imcomplete outline
-img_hull = gethull(img_edge)
+def scanentry(line, lineno, output_dir, corners_only=False):
+    """
+    CORRECT ONE MANIFEST ENTRY; RUNS INSIDE A WORKER PROCESS
+    - an entry is either a JSON string (input path) or an object with "path"
+      or "data" (base64 encoded image), and optionally "id" and "output";
+    - without "id", the id is the input's file name plus the line number
+      ("x-3"), so entries "a/x.jpg" and "b/x.jpg" don't share an output file;
+    - with "corners_only" nothing is written and the full image is never
+      decoded;
+    - returns a JSON-serializable result; never raises
+    """
 
-# obtain 4 corner points of the convex hull image
-corners = getcorners(img_hull)
+    result = {"line": lineno, "id": None, "input": None, "status": "ok"}
+    timings = {}
+    try:
+        entry = json.loads(line)
+        if isinstance(entry, str):
+            entry = {"path": entry}
+
+        path = entry.get("path")
+        result["input"] = path
+        result["id"] = entry.get("id")
+        if result["id"] is None:
+            result["id"] = (
+                f"{os.path.splitext(os.path.basename(path))[0]}-{lineno}"
+                if path else str(lineno)
+            )
+
+        source = path if path is not None else base64.b64decode(entry["data"])
+        scanned = _scan(source, timings, result, corners_only)
+        if scanned is None:
+            result["status"] = "unreadable"
+            return result
+
+        corners, scale, img_corrected = scanned
+        result["scale"] = scale
+        if corners is None:
+            result["status"] = "nocorners"
+            return result
+        result["corners"] = corners.tolist()
+        if corners_only:
+            return result
+
+        # WRITE
+        tick = time.perf_counter()
+        out_path = entry.get("output") or os.path.join(
+            output_dir, f"{result['id']}.png"
+        )
+        if not writeoutput(out_path, img_corrected):
+            result["status"] = "writefail"
+            return result
+        timings["write"] = time.perf_counter() - tick
+        result["output"] = out_path
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        result["timings"] = timings
+
+    return result
+
+
+def runmanifest(
+    stream, out, output_dir, workers=None, inflight=None, cache_args=None,
+    corners_only=False,
+):
+    """
+    STREAM A NEWLINE-DELIMITED JSON MANIFEST THROUGH THE PROCESS POOL
+    - the manifest is read lazily and at most "inflight" entries are queued at
+      a time, so memory stays constant no matter how long the job is;
+    - one JSON result is written to "out" per entry, in completion order;
+    - "cache_args" are the ScanCache arguments the workers open, if any
+    """
 
-# if no corners were found, exit the program
-if corners is None:
-    print("Could not detect the four corners of the document.")
-    print("Please try a different image with better lighting and contrast.")
-    exit(1)
+    workers = workers or os.cpu_count() or 1
+    inflight = inflight or 2 * workers
+    failed = 0
+
+    def emit(future):
+        nonlocal failed
+        result = future.result()
+        if result["status"] != "ok":
+            failed += 1
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_initworker, initargs=(cache_args,)
+    ) as pool:
+        pending = set()
+        for lineno, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if len(pending) >= inflight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future)
+            pending.add(
+                pool.submit(scanentry, line, lineno, output_dir, corners_only)
+            )
+
+        for future in as_completed(pending):
+            emit(future)
+
+    return failed
 
-# scale the corner points back to the original size of the image using the scale
-# calculated previously
-corners = corners.reshape(4, 2) * scale
 
-# finally correct the perspective of the image by applying four-point
-# perspective transform
-img_corrected = perspective_transform(img_adj, corners)
+"""
+Main Proccess of the Program
+"""
 
-# write corrected image to file
-cv2.imwrite("./corrected.png", img_corrected)
 
+def main():
+    # PARSE COMMAND-LINE ARGUMENTS WITH ARGPARSE
+    # (arguments starting with '@' are read from a file, one per line, which
+    # is how long file lists are passed to batch mode)
+    ap = argparse.ArgumentParser(fromfile_prefix_chars="@")
+    mode = ap.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
+        "-i", "--image", help="Path to the image to be corrected."
+    )
+    mode.add_argument(
+        "-b", "--batch", nargs="+", metavar="INPUT",
+        help="Directories, glob patterns or image files to correct in parallel.",
+    )
+    mode.add_argument(
+        "-m", "--manifest", action="store_true",
+        help="Read a newline-delimited JSON manifest of paths or base64 images "
+        "from stdin and write one JSON result per line to stdout.",
+    )
+    ap.add_argument(
+        "-o", "--output",
+        help="Output file for --image (default ./corrected.png) or output "
+        "directory for --batch and --manifest (default ./corrected).",
+    )
+    ap.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(),
+        help="Number of worker processes for batch mode (default: all cores).",
+    )
+    ap.add_argument(
+        "--inflight", type=int,
+        help="Maximum number of manifest entries queued at once "
+        "(default: twice the number of workers).",
+    )
+    ap.add_argument(
+        "--corners-only", action="store_true",
+        help="Manifest mode: only report the corners, without decoding the full "
+        "image or writing output.",
+    )
+    ap.add_argument(
+        "--cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR",
+        help=f"Cache detected corners by image content (default dir: {DEFAULT_CACHE_DIR}).",
+    )
+    ap.add_argument(
+        "--cache-size", type=int, default=1024, metavar="MB",
+        help="Size limit of the cache directory in MB (default: 1024).",
+    )
+    ap.add_argument(
+        "--cache-images", action="store_true",
+        help="Also cache the corrected images, not only the corners.",
+    )
+    args = vars(ap.parse_args())
+
+    cache_args = None
+    if args["cache"]:
+        cache_args = (args["cache"], args["cache_size"] * 1024 * 1024, args["cache_images"])
+
+    if args["batch"]:
+        inputs = collectinputs(args["batch"])
+        if not inputs:
+            print("No input images found!")
+            sys.exit(1)
+        failed = runbatch(
+            inputs, args["output"] or "./corrected", args["workers"], cache_args
+        )
+        sys.exit(1 if failed else 0)
+
+    if args["manifest"]:
+        failed = runmanifest(
+            sys.stdin, sys.stdout, args["output"] or "./corrected",
+            args["workers"], args["inflight"], cache_args, args["corners_only"],
+        )
+        sys.exit(1 if failed else 0)
+
+    # READ INPUT IMAGE (at reduced size for corner finding) AND CORRECT IT
+    if cache_args:
+        result = scancached(args["image"], ScanCache(*cache_args))
+    else:
+        result = scansource(args["image"])
+
+    # if input image is empty, notify the user and quit program
+    if result is None:
+        print()
+        print("The file does not exist or is empty!")
+        print("Please select a valid image file!")
+        print()
+        sys.exit(0)  # exit code zero means a clean exit with no output/errors etc.
+
+    corners, scale, img_corrected = result
+
+    # if no corners were found, exit the program
+    if corners is None:
+        print("Could not detect the four corners of the document.")
+        print("Please try a different image with better lighting and contrast.")
+        sys.exit(1)
+
+    # write corrected image to file
+    writeoutput(args["output"] or "./corrected.png", img_corrected)
+
+
+if __name__ == "__main__":
+    main()
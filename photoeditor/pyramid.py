@@ -0,0 +1,113 @@
+from collections import OrderedDict
+
+from PIL import Image
+
+# edge length of the tiles the view is composed of, in screen pixels
+TILE_SIZE = 256
+
+# number of rendered tiles kept; a 1080p view needs about 40
+MAX_TILES = 256
+
+
+class ImagePyramid:
+    """
+    MULTI-RESOLUTION, TILED VIEW OF ONE IMAGE FOR PAN AND ZOOM
+    - level k is the image reduced 2^k times (box filter); levels are built
+      on first use, each from the one above it;
+    - a view at any zoom is resampled from the smallest level that still has
+      at least the needed resolution, never from the full image when zoomed
+      out, and only the visible region is resampled;
+    - the zoomed image is cut into TILE_SIZE tiles that are cached (least
+      recently used first out), so panning only renders the tiles that
+      scroll into view
+    """
+
+    def __init__(self, image, tile_size=TILE_SIZE, max_tiles=MAX_TILES):
+        # modes the resampling filters can't work on directly
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+        self.levels = [image]
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    @property
+    def mode(self):
+        return self.levels[0].mode
+
+    def scaledsize(self, zoom):
+        """
+        SIZE OF THE WHOLE IMAGE AT "zoom" (1.0 = 100%)
+        """
+
+        w, h = self.size
+        return max(1, int(w * zoom)), max(1, int(h * zoom))
+
+    def level(self, zoom):
+        """
+        (LEVEL INDEX, LEVEL IMAGE) TO RESAMPLE FROM AT "zoom"
+        """
+
+        index = 0
+        while zoom * 2 ** (index + 1) <= 1.0 and min(self.levels[index].size) >= 2:
+            index += 1
+            if index == len(self.levels):
+                self.levels.append(self.levels[-1].reduce(2))
+        return index, self.levels[index]
+
+    def tile(self, zoom, tx, ty, resample=Image.LANCZOS):
+        """
+        TILE (tx, ty) OF THE IMAGE AT "zoom", RENDERED OR FROM THE CACHE
+        """
+
+        key = (zoom, resample, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        scaled_w, scaled_h = self.scaledsize(zoom)
+        x0, y0 = tx * self.tile_size, ty * self.tile_size
+        x1 = min(x0 + self.tile_size, scaled_w)
+        y1 = min(y0 + self.tile_size, scaled_h)
+
+        # the same region in the coordinates of the level it is taken from
+        index, level = self.level(zoom)
+        sx = level.width / float(scaled_w)
+        sy = level.height / float(scaled_h)
+        box = (x0 * sx, y0 * sy, x1 * sx, y1 * sy)
+        tile = level.resize((x1 - x0, y1 - y0), resample, box=box)
+
+        self._tiles[key] = tile
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def render(self, zoom, box, resample=Image.LANCZOS):
+        """
+        THE REGION "box" = (left, top, right, bottom) OF THE IMAGE AT "zoom"
+        - "box" is in zoomed coordinates and is clipped to the zoomed image
+        """
+
+        scaled_w, scaled_h = self.scaledsize(zoom)
+        left, top = max(0, int(box[0])), max(0, int(box[1]))
+        right, bottom = min(scaled_w, int(box[2])), min(scaled_h, int(box[3]))
+        view = Image.new(self.mode, (max(1, right - left), max(1, bottom - top)))
+
+        size = self.tile_size
+        for ty in range(top // size, (bottom - 1) // size + 1):
+            for tx in range(left // size, (right - 1) // size + 1):
+                view.paste(self.tile(zoom, tx, ty, resample), (tx * size - left, ty * size - top))
+        return view
+
+    def clear(self):
+        """
+        DROP THE CACHED TILES AND REDUCED LEVELS
+        """
+
+        del self.levels[1:]
+        self._tiles.clear()
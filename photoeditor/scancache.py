@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+# default location shared by the scanner and the GUI
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pyimgscan")
+
+# default size limit of the cache directory
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+class ScanCache:
+    """
+    CONTENT-ADDRESSED ON-DISK CACHE OF DETECTED CORNERS AND CORRECTED IMAGES
+    - entries are keyed by a hash of the source image bytes plus the detection
+      parameters, so changing either one misses the cache;
+    - every entry is a JSON record (corners etc.) and, if "images" is enabled,
+      the corrected image as PNG; layout is <root>/<key[:2]>/<key>.json|.png;
+    - files are written to a temporary name in the same directory and renamed
+      into place, so concurrent workers never read a partial entry;
+    - hits refresh the file times and the least recently used entries are
+      evicted once the directory grows past "max_bytes"
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES, images=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.images = images
+        # bytes written by this process since the directory was last measured
+        self._written = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(data, params):
+        """
+        HASH OF THE IMAGE BYTES PLUS THE PARAMETERS THAT AFFECT THE RESULT
+        """
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        digest.update(memoryview(data).cast("B"))
+        return digest.hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get(self, key):
+        """
+        CACHED RECORD FOR "key", OR None
+        """
+
+        path = self._path(key, ".json")
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(path)
+        return record
+
+    def getimage(self, key):
+        """
+        CACHED CORRECTED IMAGE (ENCODED PNG BYTES) FOR "key", OR None
+        """
+
+        path = self._path(key, ".png")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return data
+
+    def put(self, key, record, image=None):
+        """
+        STORE A RECORD AND, IF IMAGES ARE CACHED, THE ENCODED CORRECTED IMAGE
+        - the image is written first so a record never points at a missing one
+        """
+
+        written = 0
+        if image is not None and self.images:
+            written += self._write(self._path(key, ".png"), bytes(image))
+        written += self._write(self._path(key, ".json"), json.dumps(record).encode())
+
+        if self._written is None or self._written + written > self.max_bytes // 16:
+            self.evict()
+        else:
+            self._written += written
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return len(data)
+
+    def evict(self):
+        """
+        REMOVE LEAST RECENTLY USED FILES UNTIL THE CACHE FITS "max_bytes"
+        - other workers may be evicting at the same time, so files that have
+          already disappeared are skipped
+        """
+
+        entries = []
+        total = 0
+        now = time.time()
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # leftovers of writers that died before renaming into place
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > 3600:
+                        self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+        self._written = 0
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,95 @@
+import numpy as np
+from PIL import Image
+
+from edits import EditLog, crop, cropop, jpeg, jpegop, replay
+
+
+def picture(size=(400, 300)):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    return Image.fromarray(array)
+
+
+def smooth(size=(1200, 900)):
+    y, x = np.mgrid[:size[1], :size[0]]
+    array = np.stack([x * 255 // size[0], y * 255 // size[1], (x + y) % 256], axis=2)
+    return Image.fromarray(array.astype(np.uint8))
+
+
+def cropped(image):
+    corners = [[50, 40], [350, 40], [350, 260], [50, 260]]
+    op = cropop(corners, image, Image.new("RGB", (300, 220)))
+    return crop(image, op), op
+
+
+def test_undo_redo_across_crop_and_jpeg():
+    original = picture()
+    small, crop_step = cropped(original)
+    compressed = jpeg(original, jpegop(50))
+
+    log = EditLog()
+    log.append(original)
+    log.append(small, crop_step)
+    log.append(compressed, jpegop(50, from_original=True))
+
+    log.undo()
+    assert log.undo().size == (400, 300)
+    assert log.redo().size == (300, 220)
+    redone = log.redo()
+    assert redone.size == (400, 300)
+    assert np.array_equal(np.asarray(redone), np.asarray(compressed))
+
+
+def test_step_that_does_not_replay_is_kept():
+    original = picture()
+    small, crop_step = cropped(original)
+    compressed = jpeg(original, jpegop(50))
+
+    # recorded on the previous state, although the original was compressed
+    log = EditLog()
+    log.append(original)
+    log.append(small, crop_step)
+    log.append(compressed, jpegop(50))
+
+    log.undo()
+    log.undo()
+    log.redo()
+    assert np.array_equal(np.asarray(log.redo()), np.asarray(compressed))
+
+
+def test_replay_follows_the_recorded_source():
+    original = picture()
+    small, crop_step = cropped(original)
+
+    steps = [crop_step, jpegop(50, from_original=True)]
+    assert replay(original, steps).size == (400, 300)
+
+
+def test_step_that_does_not_replay_is_not_handed_on():
+    original = picture()
+    small, crop_step = cropped(original)
+    compressed = jpeg(original, jpegop(50))
+
+    log = EditLog()
+    log.append(original)
+    log.append(small, crop_step)
+    log.append(compressed, jpegop(50))
+
+    assert log.operations() == [crop_step, None]
+    assert log.recipe() == [crop_step]
+
+
+def test_large_steps_are_checked_on_a_smaller_copy():
+    original = smooth()
+    corners = [[150, 120], [1050, 120], [1050, 780], [150, 780]]
+    crop_step = cropop(corners, original, Image.new("RGB", (900, 660)))
+    small = crop(original, crop_step)
+
+    log = EditLog()
+    log.append(original)
+    log.append(small, crop_step)
+    assert log.operations() == [crop_step]
+
+    log.undo()
+    log.append(small.point(lambda v: 255 - v), crop_step)
+    assert log.operations() == [None]